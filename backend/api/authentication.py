@@ -0,0 +1,61 @@
+"""Модуль классов аутентификации приложения."""
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """Кеш соответствия токенов пользователям в кеше Django.
+
+    Записи живут TOKEN_CACHE_TTL секунд. Выход, удаление токена и
+    изменение пользователя удаляют записи из кеша Django, поэтому с
+    общим кешем (CACHE_BACKEND=file) сброс сразу действует во всех
+    процессах. Кеш хранит сериализованные объекты, и каждый запрос
+    получает свой экземпляр пользователя.
+    """
+
+    key_prefix = 'auth-token'
+
+    def make_key(self, key):
+        """Метод получения ключа кеша для токена."""
+        return f'{self.key_prefix}:{key}'
+
+    def get(self, key):
+        """Метод получения пары (пользователь, токен) или None."""
+        return cache.get(self.make_key(key))
+
+    def set(self, key, user, token):
+        """Метод сохранения пары (пользователь, токен)."""
+        cache.set(self.make_key(key), (user, token),
+                  settings.TOKEN_CACHE_TTL)
+
+    def invalidate(self, key):
+        """Метод удаления токена из кеша."""
+        cache.delete(self.make_key(key))
+
+    def invalidate_user(self, user_id):
+        """Метод удаления всех токенов пользователя из кеша."""
+        cache.delete_many([
+            self.make_key(key) for key in Token.objects.filter(
+                user_id=user_id).values_list('key', flat=True)
+        ])
+
+
+token_cache = TokenCache()
+
+
+class CachingTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешем соответствия токена пользователю.
+
+    Найденный токен не требует запроса к БД до истечения записи кеша.
+    """
+
+    def authenticate_credentials(self, key):
+        """Метод получения пользователя и токена по ключу."""
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return user, token
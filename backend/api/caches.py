@@ -0,0 +1,140 @@
+"""Модуль кеша страниц ленты рецептов."""
+import copy
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from foodgram_backend.routers import replica_state
+
+RECIPES = 'recipes'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+COUNTER_ORDERINGS = ('popular', 'trending')
+
+
+class RecipeFeedCache:
+    """Кеш сериализованных страниц списка рецептов.
+
+    Хранит страницы в виде для анонимного пользователя. Каждая запись
+    запоминает поколения своих зависимостей: общего списка рецептов,
+    тегов, ингредиентов, каждого рецепта и автора на странице. Запись
+    считается устаревшей, если поколение хотя бы одной зависимости
+    изменилось, поэтому изменение рецепта или автора сбрасывает только
+    страницы, на которых они выводятся.
+    """
+
+    key_prefix = 'recipe-feed'
+
+    @property
+    def cache(self):
+        """Свойство получения бэкенда кеша."""
+        return caches[settings.RECIPES_CACHE_ALIAS]
+
+    def generation_key(self, name):
+        """Метод получения ключа поколения зависимости."""
+        return f'{self.key_prefix}:generation:{name}'
+
+    def bump(self, *names):
+        """Метод смены поколений зависимостей.
+
+        Поколения меняются сразу и повторно после фиксации транзакции,
+        чтобы страница, закешированная параллельным запросом до
+        фиксации, тоже стала устаревшей. Новое поколение всегда
+        уникально, поэтому вытеснение ключа поколения из кеша тоже
+        делает зависящие записи устаревшими.
+        """
+        def set_generations():
+            self.cache.set_many({
+                self.generation_key(name): time.time_ns() for name in names
+            }, timeout=None)
+        set_generations()
+        transaction.on_commit(set_generations)
+
+    def get_generations(self, names):
+        """Метод получения текущих поколений зависимостей."""
+        keys = {self.generation_key(name): name for name in names}
+        generations = self.cache.get_many(keys)
+        for key in keys.keys() - generations.keys():
+            self.cache.add(key, time.time_ns(), timeout=None)
+            generations[key] = self.cache.get(key)
+        return {keys[key]: generation
+                for key, generation in generations.items()}
+
+    def is_cacheable(self, request):
+        """Метод проверки, можно ли взять страницу из кеша.
+
+        Сортировки по счетчикам избранного и тренда не кешируются:
+        счетчики меняются запросами UPDATE без сигналов, и порядок
+        страниц устаревал бы до истечения RECIPES_CACHE_TIMEOUT.
+        """
+        return settings.RECIPES_CACHE_ENABLED and not (
+            request.user.is_authenticated
+            and any(name in request.query_params for name in USER_FILTERS)
+        ) and request.query_params.get('ordering') not in COUNTER_ORDERINGS
+
+    def make_key(self, request):
+        """Метод получения ключа страницы по параметрам запроса."""
+        params = sorted(
+            (name, tuple(sorted(values)))
+            for name, values in request.query_params.lists()
+        )
+        raw_key = repr((request.build_absolute_uri(request.path), params))
+        return (f'{self.key_prefix}:page:'
+                f'{hashlib.sha256(raw_key.encode()).hexdigest()}')
+
+    @staticmethod
+    def get_dependencies(data):
+        """Метод получения зависимостей страницы.
+
+        Автор - зависимость, только если он выводится целиком.
+        """
+        dependencies = {RECIPES, TAGS, INGREDIENTS}
+        for recipe in data['results']:
+            dependencies.add(f'recipe:{recipe["id"]}')
+            if isinstance(recipe.get('author'), dict):
+                dependencies.add(f'user:{recipe["author"]["id"]}')
+        return dependencies
+
+    def get(self, request):
+        """Метод получения страницы из кеша."""
+        entry = self.cache.get(self.make_key(request))
+        if entry is None:
+            return None
+        generations, data = entry
+        if self.get_generations(generations) != generations:
+            return None
+        return data
+
+    def set(self, request, data, read_at):
+        """Метод сохранения страницы в виде для анонимного пользователя.
+
+        read_at - время в наносекундах перед чтением страницы из БД.
+        Поколения - время смены зависимостей, поэтому страница,
+        прочитанная с реплики, сохраняется, только если ни одна
+        зависимость не менялась позже чем за REPLICA_PIN_SECONDS до
+        чтения: реплика к этому моменту уже получила изменения, и
+        текущие поколения совпадают с поколениями до чтения. Иначе
+        отстающая реплика могла вернуть устаревшую страницу, и запись
+        с текущими поколениями выдавала бы ее за свежую.
+        """
+        data = copy.deepcopy(data)
+        for recipe in data['results']:
+            recipe.update(dict.fromkeys(recipe.keys() & USER_FLAGS, False))
+            if isinstance(recipe.get('author'), dict):
+                recipe['author']['is_subscribed'] = False
+        generations = self.get_generations(self.get_dependencies(data))
+        state = replica_state.get()
+        if (state is not None and state.use_replica
+                and max(generations.values())
+                > read_at - settings.REPLICA_PIN_SECONDS * 10 ** 9):
+            return
+        self.cache.set(self.make_key(request), (generations, data),
+                       timeout=settings.RECIPES_CACHE_TIMEOUT)
+
+
+recipe_feed_cache = RecipeFeedCache()
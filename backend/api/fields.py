@@ -0,0 +1,24 @@
+"""Модуль пользовательских полей сериализаторов."""
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Поле ссылок на уменьшенные варианты изображения.
+
+    Выводит словарь {вариант: {формат: абсолютная ссылка}}.
+    """
+
+    def to_representation(self, value):
+        """Метод получения ссылок на варианты."""
+        request = self.context.get('request')
+        return {
+            variant: {
+                image_format: (
+                    request.build_absolute_uri(default_storage.url(name))
+                    if request else default_storage.url(name)
+                )
+                for image_format, name in formats.items()
+            }
+            for variant, formats in value.items()
+        }
@@ -0,0 +1,97 @@
+"""Модуль выбора полей ответа параметрами запроса."""
+from rest_framework.exceptions import ValidationError
+
+REQUIRED_FIELDS = ('id',)
+
+
+def parse_names(value):
+    """Функция получения множества имен из строки через запятую."""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class Fieldset:
+    """Класс набора полей ответа.
+
+    Параметр fields оставляет в ответе только перечисленные поля,
+    omit - убирает перечисленные, id выводится всегда. Связи из
+    expand выводятся целиком, остальные - идентификаторами, без
+    параметра expand все связи выводятся целиком.
+    """
+
+    def __init__(self, names, fields=None, omit=(), expand=None):
+        self.fields = set(names) if fields is None else (
+            set(fields) | set(REQUIRED_FIELDS))
+        self.fields -= set(omit) - set(REQUIRED_FIELDS)
+        self.expand = expand
+        self.sparse = fields is not None or bool(omit)
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        """Метод получения набора полей из параметров запроса.
+
+        Неизвестные имена полей вызывают ошибку валидации.
+        """
+        params = request.query_params
+        names = serializer_class.Meta.fields
+        expandable = tuple(getattr(serializer_class, 'compact_fields', {}))
+        fields = (parse_names(params['fields']) if 'fields' in params
+                  else None)
+        omit = parse_names(params.get('omit', ''))
+        expand = (parse_names(params['expand']) if 'expand' in params
+                  else None)
+        errors = {}
+        for param, values, allowed in (('fields', fields, names),
+                                       ('omit', omit, names),
+                                       ('expand', expand, expandable)):
+            unknown = set(values or ()) - set(allowed)
+            if unknown:
+                errors[param] = (
+                    f'Неизвестные поля: {", ".join(sorted(unknown))}. '
+                    f'Допустимые: {", ".join(allowed)}.'
+                )
+        if errors:
+            raise ValidationError(errors)
+        return cls(names, fields, omit, expand)
+
+    def __contains__(self, name):
+        return name in self.fields
+
+    def expands(self, name):
+        """Метод проверки, что связь выводится целиком."""
+        return name in self and (self.expand is None or name in self.expand)
+
+    @property
+    def key(self):
+        """Свойство строкового ключа набора полей для ETag.
+
+        Для ответа со всеми полями ключ пустой.
+        """
+        if not self.sparse and self.expand is None:
+            return ''
+        expand = ('*' if self.expand is None
+                  else ','.join(sorted(self.expand)))
+        return f'{",".join(sorted(self.fields))};{expand}'
+
+
+class SparseFieldsetMixin:
+    """Примесь сериализатора, выводящего поля из набора в контексте.
+
+    Поля, которых нет в наборе context['fieldset'], удаляются, а
+    связи из compact_fields, не раскрытые параметром expand,
+    заменяются полями, которые создают функции этого словаря.
+    """
+
+    compact_fields = {}
+
+    def get_fields(self):
+        """Метод получения полей с учетом набора полей."""
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None:
+            return fields
+        for name in list(fields):
+            if name not in fieldset:
+                del fields[name]
+            elif name in self.compact_fields and not fieldset.expands(name):
+                fields[name] = self.compact_fields[name]()
+        return fields
@@ -1,8 +1,20 @@
 """Модуль пользовательских фильтров."""
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, When
+from django.db.models.functions import Cast
 from django_filters import rest_framework as filters
 
+from recipes.constants import SEARCH_CONFIG
 from recipes.models import Ingredient, Recipe, Tag
 
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-published_at', '-id'),
+    'trending': ('-trending_score', '-published_at', '-id'),
+    'cooking_time': ('cooking_time', '-published_at', '-id'),
+}
+
 
 class RecipeFilter(filters.FilterSet):
     """Фильтр выборки рецептов по определенным полям."""
@@ -19,12 +31,18 @@ class RecipeFilter(filters.FilterSet):
     is_favorited = filters.BooleanFilter(
         field_name='is_favorited', method='filter_is_favorited'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=tuple((name, name) for name in RECIPE_ORDERINGS),
+        method='filter_ordering'
+    )
 
     class Meta:
         """Класс модели и полей фильтрации."""
 
         model = Recipe
-        fields = ('tags', 'author', 'is_in_shopping_cart', 'is_favorited',)
+        fields = ('tags', 'author', 'is_in_shopping_cart', 'is_favorited',
+                  'search', 'ordering',)
 
     def filter_is_favorited(self, queryset, name, value):
         """Метод фильтрации избранного."""
@@ -39,6 +57,43 @@ class RecipeFilter(filters.FilterSet):
                 shopping_cart_recipe__user=self.request.user)
         return queryset
 
+    def filter_search(self, queryset, name, value):
+        """Метод поиска по названию и тексту рецепта.
+
+        В PostgreSQL используется полнотекстовый поиск по поисковому
+        вектору с ранжированием и поиск по триграммам названия для
+        запросов с опечатками. В остальных базах данных выполняется
+        поиск вхождения подстроки.
+
+        Ранг и сходство возвращаются в real и приводятся к double
+        precision: курсор хранит их как float Python, и сравнение со
+        значением из курсора должно быть точным.
+        """
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            ).annotate(search_rank=Case(
+                When(name__icontains=value, then=1), default=0
+            )).order_by('-search_rank', '-published_at')
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query),
+                             FloatField()),
+            name_similarity=Cast(TrigramSimilarity('name', value),
+                                 FloatField()),
+        ).order_by('-search_rank', '-name_similarity', '-published_at')
+
+    def filter_ordering(self, queryset, name, value):
+        """Метод сортировки по популярности, тренду или времени.
+
+        Рейтинг тренда заранее рассчитывается командой
+        update_trending_scores.
+        """
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
 
 class IngredientFilter(filters.FilterSet):
     """Класс фильтра для выбора по началу названия игредиента."""
@@ -0,0 +1,83 @@
+"""Модуль индексов, хранящихся в памяти процесса."""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов для автодополнения по названию.
+
+    Хранит отсортированный по названию в нижнем регистре список
+    ингредиентов и ищет по нему бинарным поиском. Загружается при
+    первом обращении, сбрасывается сигналами изменения ингредиентов
+    и перезагружается по истечении INGREDIENT_INDEX_TTL секунд, чтобы
+    изменения из других процессов тоже становились видны.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._ingredients = None
+        self._loaded_at = 0
+
+    def invalidate(self):
+        """Метод сброса индекса."""
+        with self._lock:
+            self._keys = None
+            self._ingredients = None
+
+    def _load(self):
+        """Метод загрузки индекса из базы данных."""
+        with self._lock:
+            if (self._keys is not None and time.monotonic()
+                    - self._loaded_at < settings.INGREDIENT_INDEX_TTL):
+                return self._keys, self._ingredients
+            ingredients = sorted(
+                (
+                    {'id': id, 'name': name,
+                     'measurement_unit': measurement_unit}
+                    for id, name, measurement_unit
+                    in Ingredient.objects.values_list(
+                        'id', 'name', 'measurement_unit')
+                ),
+                key=lambda ingredient: (ingredient['name'].casefold(),
+                                        ingredient['name'])
+            )
+            self._keys = [ingredient['name'].casefold()
+                          for ingredient in ingredients]
+            self._ingredients = ingredients
+            self._loaded_at = time.monotonic()
+            return self._keys, self._ingredients
+
+    def search(self, name, limit=None):
+        """Метод поиска ингредиентов по названию.
+
+        Сначала возвращаются ингредиенты, начинающиеся с name, затем
+        содержащие name, ранжированные по позиции вхождения.
+        """
+        if limit is None:
+            limit = settings.INGREDIENT_SEARCH_LIMIT
+        keys, ingredients = self._load()
+        name = name.casefold()
+        results = []
+        position = bisect_left(keys, name)
+        while (position < len(keys) and len(results) < limit
+               and keys[position].startswith(name)):
+            results.append(ingredients[position])
+            position += 1
+        if len(results) >= limit or not name:
+            return results
+        contains = sorted(
+            (key.find(name), index)
+            for index, key in enumerate(keys) if key.find(name) > 0
+        )
+        results += [ingredients[index]
+                    for _, index in contains[:limit - len(results)]]
+        return results
+
+
+ingredient_index = IngredientPrefixIndex()
@@ -0,0 +1,277 @@
+"""Модуль пользовательского скрипта замера производительности API."""
+import json
+import re
+import subprocess
+import time
+from collections import Counter
+from statistics import mean
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+import requests
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import FoodgramUser, Ingredient, Recipe, Tag
+
+PERCENTILES = (50, 90, 95, 99)
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+REQUEST_TIMEOUT = 60
+
+
+def percentile(values, rank):
+    """Функция получения процентиля отсортированного списка."""
+    position = (len(values) - 1) * rank / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def get_revision():
+    """Функция получения текущей ревизии git, если она доступна."""
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """Команда для замера задержек и числа запросов основных эндпоинтов.
+
+    Запросы выполняются от имени пользователя с наибольшим числом
+    подписок тестовым клиентом Django к текущей базе данных или по HTTP
+    к запущенному серверу с той же базой (--url). Тестовый клиент не
+    закрывает соединения с БД между запросами, поэтому влияние
+    CONN_MAX_AGE и пула соединений замеряется только через --url. Число
+    SQL-запросов сервера берется из заголовка Server-Timing, если на нем
+    включен QUERY_TIMING_ENABLED.
+    """
+
+    help = ('Замеряет задержки и число SQL-запросов основных эндпоинтов '
+            'API и сохраняет результаты в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50,
+                            help='Число замеряемых запросов к эндпоинту.')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='Число предварительных запросов.')
+        parser.add_argument('--user', type=int,
+                            help='id пользователя, от имени которого '
+                                 'выполняются запросы.')
+        parser.add_argument('--no-cache', action='store_true',
+                            help='Отключить кеш страниц списка рецептов '
+                                 '(только для тестового клиента).')
+        parser.add_argument('--url',
+                            help='Адрес запущенного сервера, например '
+                                 'http://localhost:8000.')
+        parser.add_argument('--output',
+                            help='Путь к файлу результатов в JSON.')
+        parser.add_argument('--compare',
+                            help='Путь к JSON с прошлыми результатами '
+                                 'для сравнения.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужен хотя бы один замеряемый запрос.')
+        user = self.get_user(options['user'])
+        fetch = (self.get_http_fetch(options['url'], user) if options['url']
+                 else self.get_client_fetch(user))
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if options['no_cache']:
+            overrides['RECIPES_CACHE_ENABLED'] = False
+        with override_settings(**overrides):
+            endpoints = {
+                name: self.measure(fetch, paths, options['iterations'],
+                                   options['warmup'])
+                for name, paths in self.get_endpoints().items()
+            }
+        results = {
+            'meta': {
+                'revision': get_revision(),
+                'created_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'url': options['url'],
+                'iterations': options['iterations'],
+                'cache': not options['no_cache'],
+                'recipes': Recipe.objects.count(),
+            },
+            'endpoints': endpoints,
+        }
+        baseline = {}
+        if options['compare']:
+            baseline = self.load(options['compare'])['endpoints']
+        self.report(endpoints, baseline)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def load(path):
+        """Метод чтения прошлых результатов."""
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}.')
+
+    @staticmethod
+    def get_user(user_id):
+        """Метод получения пользователя для замеров."""
+        users = FoodgramUser.objects.annotate(
+            subscriptions=Count('owner_subscriptions')
+        ).order_by('-subscriptions', 'id')
+        user = (users.filter(id=user_id) if user_id else users).first()
+        if user is None:
+            raise CommandError(
+                'Нет пользователей, сначала выполните generate_data.')
+        return user
+
+    @staticmethod
+    def get_endpoints():
+        """Метод получения путей запросов к эндпоинтам.
+
+        Возвращает словарь {эндпоинт: список путей}, пути
+        перебираются по кругу.
+        """
+        recipes = list(Recipe.objects.order_by('?').values_list(
+            'id', 'author_id', 'name')[:20]) or [(0, 0, '')]
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:3])
+        prefixes = sorted({
+            name[:2] for name in Ingredient.objects.order_by(
+                '?').values_list('name', flat=True)[:20]
+        }) or ['а']
+        return {
+            'recipes_list': ['/api/recipes/?limit=6'],
+            'recipes_list_tags': [
+                '/api/recipes/?limit=6&' + '&'.join(
+                    f'tags={slug}' for slug in slugs)],
+            'recipes_list_author': [
+                f'/api/recipes/?limit=6&author={author_id}'
+                for _, author_id, _ in recipes],
+            'recipes_list_favorited': [
+                '/api/recipes/?limit=6&is_favorited=1'],
+            'recipes_list_in_shopping_cart': [
+                '/api/recipes/?limit=6&is_in_shopping_cart=1'],
+            'recipes_list_search': [
+                f'/api/recipes/?limit=6&search={name.split()[0]}'
+                for _, _, name in recipes if name],
+            'recipes_list_popular': [
+                '/api/recipes/?limit=6&ordering=popular'],
+            'recipe_retrieve': [
+                f'/api/recipes/{recipe_id}/' for recipe_id, _, _ in recipes],
+            'subscriptions': [
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'],
+            'download_shopping_cart': [
+                '/api/recipes/download_shopping_cart/'],
+            'ingredients_autocomplete': [
+                f'/api/ingredients/?name={prefix}' for prefix in prefixes],
+        }
+
+    @staticmethod
+    def get_client_fetch(user):
+        """Метод получения функции запроса через тестовый клиент.
+
+        Функция возвращает код ответа и число SQL-запросов.
+        """
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        def fetch(path):
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return response.status_code, len(context)
+
+        return fetch
+
+    @staticmethod
+    def get_http_fetch(url, user):
+        """Метод получения функции запроса к серверу по HTTP.
+
+        Функция возвращает код ответа и число SQL-запросов из заголовка
+        Server-Timing или None, если его нет.
+        """
+        session = requests.Session()
+        token, _ = Token.objects.get_or_create(user=user)
+        session.headers['Authorization'] = f'Token {token.key}'
+
+        def fetch(path):
+            try:
+                response = session.get(url.rstrip('/') + path,
+                                       timeout=REQUEST_TIMEOUT)
+            except requests.RequestException as error:
+                raise CommandError(f'Ошибка запроса {path}: {error}.')
+            match = SERVER_TIMING_QUERIES.search(
+                response.headers.get('Server-Timing', ''))
+            return response.status_code, match and int(match[1])
+
+        return fetch
+
+    @staticmethod
+    def measure(fetch, paths, iterations, warmup):
+        """Метод замера запросов к одному эндпоинту."""
+        latencies, queries, statuses = [], [], Counter()
+        for number in range(warmup + iterations):
+            path = paths[number % len(paths)]
+            start = time.perf_counter()
+            status_code, query_count = fetch(path)
+            elapsed = (time.perf_counter() - start) * 1000
+            if number >= warmup:
+                latencies.append(elapsed)
+                queries.append(query_count)
+                statuses[status_code] += 1
+        latencies.sort()
+        return {
+            'path': paths[0],
+            'status_codes': {str(code): count
+                             for code, count in sorted(statuses.items())},
+            'latency_ms': {
+                'min': round(latencies[0], 3),
+                'mean': round(mean(latencies), 3),
+                **{f'p{rank}': round(percentile(latencies, rank), 3)
+                   for rank in PERCENTILES},
+                'max': round(latencies[-1], 3),
+            },
+            'queries': None if None in queries else {
+                'min': min(queries),
+                'mean': round(mean(queries), 2),
+                'max': max(queries),
+            },
+        }
+
+    def report(self, endpoints, baseline):
+        """Метод вывода таблицы результатов и отличий от прошлых."""
+        self.stdout.write(
+            f'{"эндпоинт":32} {"p50, мс":>9} {"p95, мс":>9} {"запросов":>9}')
+        for name, result in endpoints.items():
+            latency = result['latency_ms']
+            queries = (result['queries'] or {}).get('max')
+            line = (f'{name:32} {latency["p50"]:9.2f} {latency["p95"]:9.2f} '
+                    f'{"-" if queries is None else queries:>9}')
+            previous = baseline.get(name)
+            if previous:
+                p50_change = self.change(previous['latency_ms']['p50'],
+                                         latency['p50'])
+                line += f'  p50 {p50_change}'
+                previous_queries = (previous['queries'] or {}).get('max')
+                if None not in (queries, previous_queries):
+                    line += f', запросов {queries - previous_queries:+}'
+            self.stdout.write(line)
+
+    @staticmethod
+    def change(previous, current):
+        """Метод получения относительного изменения в процентах."""
+        if not previous:
+            return 'н/д'
+        return f'{(current - previous) / previous:+.0%}'
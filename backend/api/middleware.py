@@ -0,0 +1,186 @@
+"""Модуль промежуточных слоев приложения."""
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, Serializer
+
+from foodgram_backend.routers import (PIN_COOKIE, ReplicaState, pin_user,
+                                      replica_configured, replica_state)
+
+logger = logging.getLogger('api.timing')
+
+current_timing = ContextVar('current_timing', default=None)
+
+SQL_LOG_LENGTH = 300
+
+
+def get_serializer_field():
+    """Функция получения поля сериализатора, которое выполняет запрос.
+
+    Ищет ближайший вызов Serializer.to_representation в стеке,
+    его локальная переменная field - обрабатываемое поле.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code.co_name == 'to_representation':
+            serializer = frame.f_locals.get('self')
+            field = frame.f_locals.get('field')
+            if isinstance(serializer, Serializer) and field is not None:
+                return f'{type(serializer).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+class RequestTiming:
+    """Класс замеров SQL-запросов и сериализации одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.statements = Counter()
+        self.fields = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        """Метод замера SQL-запроса, используется как execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+            if self.statements[sql] == 2:
+                self.fields[sql] = get_serializer_field()
+
+    def get_repeated(self):
+        """Метод получения повторяющихся запросов (признак N+1)."""
+        return [
+            {'sql': sql[:SQL_LOG_LENGTH], 'count': count,
+             'field': self.fields.get(sql)}
+            for sql, count in self.statements.most_common()
+            if count >= settings.QUERY_REPEAT_THRESHOLD
+        ]
+
+
+def install_serializer_timing():
+    """Функция подключения замера времени сериализации.
+
+    Оборачивает свойство BaseSerializer.data, через которое получают
+    данные и обычные, и списковые сериализаторы. Учитывается только
+    внешний вызов, вложенные входят в его время.
+    """
+    original = BaseSerializer.data.fget
+    if getattr(original, 'timed', False):
+        return
+
+    def data(self):
+        timing = current_timing.get()
+        if timing is None or timing.serializer_depth:
+            return original(self)
+        timing.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return original(self)
+        finally:
+            timing.serializer_depth -= 1
+            timing.serializer_time += time.perf_counter() - start
+
+    data.timed = True
+    BaseSerializer.data = property(data)
+
+
+class QueryTimingMiddleware:
+    """Промежуточный слой замера SQL-запросов и времени обработки.
+
+    Включается настройкой QUERY_TIMING_ENABLED. Время БД, сериализации
+    и обработки запроса целиком передается в заголовке Server-Timing
+    и в журнал api.timing одной JSON-строкой. Запросы, превысившие
+    QUERY_BUDGET или повторяющие один SQL не менее
+    QUERY_REPEAT_THRESHOLD раз, пишутся с уровнем WARNING.
+    Запросы, выполняемые при отдаче потокового ответа, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        install_serializer_timing()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = RequestTiming()
+        token = current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        view_time = time.perf_counter() - start
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={timing.db_time * 1000:.2f};'
+            f'desc="{timing.queries} queries"',
+            f'serializer;dur={timing.serializer_time * 1000:.2f}',
+            f'view;dur={view_time * 1000:.2f}',
+        ))
+        repeated = timing.get_repeated()
+        over_budget = timing.queries > settings.QUERY_BUDGET
+        logger.log(
+            logging.WARNING if over_budget or repeated else logging.INFO,
+            json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'queries': timing.queries,
+                'db_ms': round(timing.db_time * 1000, 2),
+                'serializer_ms': round(timing.serializer_time * 1000, 2),
+                'view_ms': round(view_time * 1000, 2),
+                'over_budget': over_budget,
+                'repeated': repeated,
+            }, ensure_ascii=False)
+        )
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Промежуточный слой состояния маршрутизации чтения с реплики.
+
+    Включается, если настроена реплика БД. После записи клиент
+    получает cookie, а пользователь - отметку в кеше, и в течение
+    REPLICA_PIN_SECONDS его запросы читают с основной БД, поэтому
+    он сразу видит свои изменения.
+    """
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReplicaState(pinned=PIN_COOKIE in request.COOKIES)
+        token = replica_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            replica_state.reset(token)
+        if state.written or request.method not in SAFE_METHODS:
+            response.set_cookie(PIN_COOKIE, '1',
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax')
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_user(user.pk)
+        return response
@@ -0,0 +1,96 @@
+"""Модуль примесей представлений."""
+from django.conf import settings
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend.routers import is_user_pinned, replica_state
+from recipes.models import ContentVersion
+
+
+class ConditionalResponseMixin:
+    """Примесь условных ответов по версии данных.
+
+    Представление возвращает ETag, Last-Modified и Cache-Control и
+    отвечает 304 на If-None-Match и If-Modified-Since, не выполняя
+    сериализацию.
+    """
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        """Метод получения ETag и даты изменения данных.
+
+        Возвращает кортеж (etag, last_modified) или None, если ответ
+        не должен кешироваться.
+        """
+        return None
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """Метод формирования ответа с учетом условных заголовков."""
+        validators = self.get_conditional_validators(request, *args, **kwargs)
+        if validators is None:
+            return handler(request, *args, **kwargs)
+        etag, last_modified = validators
+        etag = quote_etag(etag)
+        last_modified = last_modified and int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(
+                response, max_age=settings.HTTP_CACHE_MAX_AGE,
+                **({'private': True} if request.user.is_authenticated
+                   else {'public': True})
+            )
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class VersionedCatalogueMixin(ConditionalResponseMixin):
+    """Примесь условных ответов для справочников по их версии."""
+
+    version_name = None
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        """Метод получения ETag и даты изменения справочника."""
+        version, updated_at = ContentVersion.objects.get_versions(
+            (self.version_name,))[self.version_name]
+        return f'{self.version_name}-{version}', updated_at
+
+    def list(self, request, *args, **kwargs):
+        """Метод получения списка с учетом условных заголовков."""
+        return self.conditional_response(super().list, request,
+                                         *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Метод получения объекта с учетом условных заголовков."""
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Примесь чтения с реплики БД для безопасных запросов.
+
+    Разрешение выдается после аутентификации, поэтому токен и
+    пользователь всегда читаются с основной БД. Действия, которым
+    можно читать с реплики, перечисляются в replica_actions,
+    None - все безопасные запросы представления.
+    """
+
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        """Метод разрешения чтения с реплики перед обработкой запроса."""
+        super().initial(request, *args, **kwargs)
+        state = replica_state.get()
+        if (state is None or request.method not in SAFE_METHODS
+                or self.replica_actions is not None
+                and self.action not in self.replica_actions):
+            return
+        state.allowed = True
+        if request.user.is_authenticated and is_user_pinned(request.user.pk):
+            state.pinned = True
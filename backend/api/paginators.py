@@ -1,8 +1,123 @@
 """Модуль пользовательской пагинации."""
-from rest_framework.pagination import PageNumberPagination
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
 
 
 class RecipesPageNumberPagination(PageNumberPagination):
     """Класс пользовательской пагинации."""
 
     page_size_query_param = 'limit'
+
+
+class RecipesCursorPagination(CursorPagination):
+    """Класс курсорной пагинации рецептов по составному ключу.
+
+    Курсор хранит значения всех полей сортировки крайнего рецепта
+    страницы, а соседняя страница выбирается условием
+    (поле, ..., published_at, id) < (значения курсора) без COUNT(*)
+    и OFFSET, поэтому дальние страницы не дороже первой, а рецепты
+    с одинаковым значением первого поля не теряются и не повторяются.
+    Сортировка берется из выборки: по популярности, тренду, времени
+    приготовления или рангу поиска, по умолчанию - по дате публикации.
+    """
+
+    page_size_query_param = 'limit'
+    ordering = ('-published_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        """Метод получения сортировки выборки, замкнутой полем id."""
+        ordering = tuple(queryset.query.order_by) or self.ordering
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering += ('-id',)
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Метод получения страницы рецептов после или перед курсором."""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+        ordering = (tuple(self.invert(field) for field in self.ordering)
+                    if reverse else self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(ordering, self.get_cursor_values()))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+        return self.page
+
+    def get_cursor_values(self):
+        """Метод получения значений полей сортировки из курсора."""
+        try:
+            values = json.loads(self.cursor.position)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def invert(field):
+        """Метод смены направления сортировки поля."""
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_keyset_filter(ordering, values):
+        """Метод получения условия строк после курсора в порядке выборки.
+
+        Кортежи сравниваются лексикографически: первое поле строго
+        дальше, или оно равно, а дальше следующее, и так далее.
+        Условие через OR не годится для поиска по индексу, поэтому к
+        нему добавляется избыточная граница первого поля: по ней
+        PostgreSQL читает диапазон индекса, начиная с курсора.
+        """
+        keyset = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            keyset |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        field, value = ordering[0], values[0]
+        lookup = 'lte' if field.startswith('-') else 'gte'
+        return Q(**{f'{field.lstrip("-")}__{lookup}': value}) & keyset
+
+    def get_cursor_link(self, instance, reverse):
+        """Метод получения ссылки на страницу после или перед рецептом.
+
+        Даты хранятся в курсоре с микросекундами, иначе условие
+        равенства не совпадет с сохраненным значением.
+        """
+        position = json.dumps(
+            [getattr(instance, field.lstrip('-')) for field in self.ordering],
+            default=lambda value: value.isoformat()
+        )
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=reverse, position=position))
+
+    def get_next_link(self):
+        """Метод получения ссылки на следующую страницу."""
+        if not self.has_next or not self.page:
+            return None
+        return self.get_cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        """Метод получения ссылки на предыдущую страницу."""
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_cursor_link(self.page[0], reverse=True)
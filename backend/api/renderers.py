@@ -0,0 +1,21 @@
+"""Модуль пользовательских рендереров."""
+from rest_framework.renderers import BaseRenderer
+
+
+class PlainTextRenderer(BaseRenderer):
+    """Рендерер текстового списка покупок."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Метод вывода данных в виде текста."""
+        return str(data).encode(self.charset)
+
+
+class CSVRenderer(PlainTextRenderer):
+    """Рендерер списка покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
@@ -1,20 +1,29 @@
 """Модуль сериализаторов приложения."""
+from functools import partial
 from http import HTTPStatus
 
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
-from recipes.constants import MAX_VALIDATOR_VALUE, MIN_VALIDATOR_VALUE
+from recipes.constants import (BATCH_MAX_SIZE, MAX_VALIDATOR_VALUE,
+                               MIN_VALIDATOR_VALUE)
+from recipes.images import process_avatar, process_recipe_image, schedule
 from recipes.models import (Favorite, FoodgramUser, Ingredient,
-                            IngredientInRecipe, Recipe,
-                            ShoppingCart, Subscription, Tag)
+                            IngredientInRecipe, Recipe, ShoppingCart,
+                            Subscription, Tag)
+from recipes.signals import ingredients_changed
+
+from .fields import ImageVariantsField
+from .fieldsets import SparseFieldsetMixin
 
 
 class FoodgramUserSerializer(UserSerializer):
     """Класс сериализатора для пользователя."""
 
     avatar = Base64ImageField()
+    avatar_variants = ImageVariantsField()
     is_subscribed = serializers.SerializerMethodField(
         read_only=True,
     )
@@ -27,10 +36,13 @@ class FoodgramUserSerializer(UserSerializer):
         """
 
         model = FoodgramUser
-        fields = UserSerializer.Meta.fields + ('is_subscribed', 'avatar', )
+        fields = UserSerializer.Meta.fields + ('is_subscribed', 'avatar',
+                                               'avatar_variants',)
 
     def get_is_subscribed(self, obj):
         """Метод проверки подписки пользователя."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and obj.author_subscriptions.filter(
@@ -45,6 +57,13 @@ class FoodgramUserSerializer(UserSerializer):
             )
         return data
 
+    def update(self, instance, validated_data):
+        """Метод обновления пользователя с обработкой аватара."""
+        instance = super().update(instance, validated_data)
+        if validated_data.get('avatar'):
+            schedule(process_avatar, instance.id)
+        return instance
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор для модели тегов."""
@@ -82,26 +101,50 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('amount',)
 
 
+class IngredientAmountSerializer(serializers.ModelSerializer):
+    """Сериализатор id и количества ингредиента рецепта."""
+
+    id = serializers.ReadOnlyField(source='ingredient_id')
+
+    class Meta:
+        """Класс сериализатора для определения модели и отображаемых полей."""
+
+        model = IngredientInRecipe
+        fields = ('id', 'amount',)
+        read_only_fields = ('amount',)
+
+
 class RecipeGetShortSerializer(serializers.ModelSerializer):
     """Сериализатор для получения коротких рецептов подписок."""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         """Класс сериализатора для определения модели и отображаемых полей."""
 
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
         read_only_fields = ('id', 'name', 'image', 'cooking_time',)
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Сериализатор для получения рецептов."""
 
+    compact_fields = {
+        'author': partial(serializers.PrimaryKeyRelatedField, read_only=True),
+        'tags': partial(serializers.PrimaryKeyRelatedField,
+                        many=True, read_only=True),
+        'ingredients': partial(IngredientAmountSerializer, many=True,
+                               source='ingredientinrecipe', read_only=True),
+    }
+
     author = FoodgramUserSerializer(read_only=True,)
     tags = TagSerializer(many=True, read_only=True,)
     ingredients = IngredientInRecipeSerializer(
         many=True, source='ingredientinrecipe', read_only=True
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
 
@@ -110,13 +153,15 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time',)
+                  'is_in_shopping_cart', 'name', 'image', 'image_variants',
+                  'text', 'cooking_time',)
         read_only_fields = ('id', 'author', 'tags', 'is_favorited',
                             'is_in_shopping_cart',)
 
     def get_is_favorited(self, obj):
         """Метод определения находится ли рецепт в избранном."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and request.user.favorite_recipe.filter(
@@ -125,6 +170,8 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """Метод определения находится ли рецепт в корзине."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and request.user.shopping_cart_recipe.filter(
@@ -132,9 +179,14 @@ class RecipeGetSerializer(serializers.ModelSerializer):
                 ).exists())
 
 
-class SubscriptionGetSerializer(FoodgramUserSerializer):
+class SubscriptionGetSerializer(SparseFieldsetMixin, FoodgramUserSerializer):
     """Класс сериализатора  модели подписок."""
 
+    compact_fields = {
+        'recipes': partial(serializers.SerializerMethodField,
+                           method_name='get_recipe_ids'),
+    }
+
     recipes_count = serializers.IntegerField(default=0,)
     recipes = serializers.SerializerMethodField(read_only=True)
 
@@ -147,21 +199,36 @@ class SubscriptionGetSerializer(FoodgramUserSerializer):
         )
         read_only_fields = ('id', 'recipes_count', 'recipes', )
 
-    def get_recipes(self, obj):
-        """Метод получения рецептов."""
-        recipes_list = obj.recipes.all()
+    @staticmethod
+    def get_recipes_limit(request):
+        """Метод получения ограничения числа рецептов из запроса."""
         try:
-            recipes_limit = int(self.context['request'].query_params.get(
-                'recipes_limit'
-            ))
+            return int(request.query_params.get('recipes_limit'))
         except (ValueError, TypeError):
-            recipes_limit = None
-        instance = recipes_list[:recipes_limit]
+            return None
+
+    def get_limited_recipes(self, obj):
+        """Метод получения рецептов автора с учетом ограничения.
+
+        Если рецепты авторов страницы загружены одним запросом,
+        используются они.
+        """
+        if hasattr(obj, 'limited_recipes'):
+            return obj.limited_recipes
+        return obj.recipes.all()[
+            :self.get_recipes_limit(self.context['request'])]
+
+    def get_recipes(self, obj):
+        """Метод получения рецептов."""
         return RecipeGetShortSerializer(
-            instance=instance, context=self.context,
+            instance=self.get_limited_recipes(obj), context=self.context,
             many=True
         ).data
 
+    def get_recipe_ids(self, obj):
+        """Метод получения id рецептов."""
+        return [recipe.id for recipe in self.get_limited_recipes(obj)]
+
 
 class SubscriptionPostSerializer(serializers.ModelSerializer):
     """Класс сериализатора  модели подписок."""
@@ -223,6 +290,15 @@ class FavoriteRecipesSerializer(FavoriteShoppingcartBaseSerializer):
         fields = ('user', 'recipe',)
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка id рецептов для пакетных операций."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False, max_length=BATCH_MAX_SIZE,
+    )
+
+
 class IngredientInRecipeShortSerializer(serializers.ModelSerializer):
     """Короткий сериализатор модели."""
 
@@ -319,17 +395,63 @@ class RecipesSerializer(serializers.ModelSerializer):
         self.create_ingredients(
             recipe_id=recipe.id, ingredients=ingredients
         )
+        schedule(process_recipe_image, recipe.id)
         return recipe
 
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Метод изменения ингредиентов рецепта по разнице с текущими.
+
+        Возвращает словари добавленных, измененных и удаленных ингредиентов.
+        """
+        amounts = {ingredient['id'].id: ingredient['amount']
+                   for ingredient in ingredients}
+        existing = {row.ingredient_id: row for row in
+                    IngredientInRecipe.objects.filter(recipe=recipe)}
+        added = {ingredient_id: amount
+                 for ingredient_id, amount in amounts.items()
+                 if ingredient_id not in existing}
+        removed = {ingredient_id: row.amount
+                   for ingredient_id, row in existing.items()
+                   if ingredient_id not in amounts}
+        changed = {}
+        changed_rows = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                changed[ingredient_id] = (row.amount, amount)
+                row.amount = amount
+                changed_rows.append(row)
+        if added:
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                                   amount=amount)
+                for ingredient_id, amount in added.items()
+            )
+        if changed_rows:
+            IngredientInRecipe.objects.bulk_update(changed_rows, ['amount'])
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        return added, changed, removed
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Метод обновления записи."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         instance.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=instance).delete()
-        self.create_ingredients(
-            recipe_id=instance.id, ingredients=ingredients
+        added, changed, removed = self.update_ingredients(
+            recipe=instance, ingredients=ingredients
         )
+        if added or changed or removed:
+            ingredients_changed.send(
+                sender=Recipe, instance=instance, added=added,
+                changed=changed, removed=removed
+            )
+        if 'image' in validated_data:
+            schedule(process_recipe_image, instance.id)
         return super().update(instance=instance, validated_data=validated_data)
 
 
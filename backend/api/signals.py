@@ -0,0 +1,114 @@
+"""Модуль обработчиков сигналов приложения api."""
+from django.contrib.auth.signals import user_logged_out
+from django.core.signals import request_started
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .caches import INGREDIENTS, RECIPES, TAGS, recipe_feed_cache
+from .indexes import ingredient_index
+from recipes.models import (ContentVersion, FoodgramUser, Ingredient, Recipe,
+                            Tag)
+from recipes.signals import bulk_changed
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Функция сброса индекса ингредиентов при их изменении."""
+    ingredient_index.invalidate()
+    ContentVersion.objects.bump(ContentVersion.INGREDIENTS)
+    recipe_feed_cache.bump(INGREDIENTS)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Функция увеличения версии тегов при их изменении."""
+    ContentVersion.objects.bump(ContentVersion.TAGS)
+    recipe_feed_cache.bump(TAGS)
+
+
+@receiver((post_save, post_delete), sender=FoodgramUser)
+def bump_users_version(sender, instance, update_fields=None, **kwargs):
+    """Функция увеличения версии пользователей при их изменении.
+
+    Обновление только даты последнего входа не меняет данные,
+    которые выводит API.
+    """
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        ContentVersion.objects.bump(ContentVersion.USERS)
+        recipe_feed_cache.bump(f'user:{instance.id}')
+
+
+@receiver((post_save, post_delete), sender=FoodgramUser)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    """Функция сброса токенов пользователя в кеше при его изменении.
+
+    Так деактивированный пользователь сразу теряет доступ.
+    """
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+def invalidate_tokens_on_logout(sender, user, **kwargs):
+    """Функция сброса токенов пользователя в кеше при выходе."""
+    if user is not None:
+        token_cache.invalidate_user(user.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(sender, instance, **kwargs):
+    """Функция сброса удаленного токена в кеше."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=Recipe)
+def invalidate_recipe_feed(sender, instance, created, **kwargs):
+    """Функция сброса страниц ленты при сохранении рецепта.
+
+    Новый рецепт меняет состав всех страниц, а изменение
+    существующего - только страниц, на которых он выводится.
+    """
+    recipe_feed_cache.bump(RECIPES if created else f'recipe:{instance.id}')
+
+
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe_feed_on_delete(sender, **kwargs):
+    """Функция сброса страниц ленты при удалении рецепта."""
+    recipe_feed_cache.bump(RECIPES)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_feed_on_tags(sender, action, **kwargs):
+    """Функция сброса страниц ленты при изменении тегов рецепта."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        recipe_feed_cache.bump(RECIPES)
+
+
+@receiver(bulk_changed)
+def invalidate_recipe_feed_on_bulk_change(sender, models, **kwargs):
+    """Функция сброса страниц ленты после массовой загрузки данных."""
+    generations = {Recipe: RECIPES, Tag: TAGS, Ingredient: INGREDIENTS}
+    names = [generations[model] for model in models if model in generations]
+    if names:
+        recipe_feed_cache.bump(*names)
+    if Ingredient in models:
+        ingredient_index.invalidate()
+
+
+@receiver(request_started)
+def check_persistent_connections(**kwargs):
+    """Функция проверки постоянных соединений с БД перед запросом.
+
+    Соединение, разорванное сервером БД между запросами, закрывается,
+    и запрос открывает новое вместо ошибки. Проверка включается
+    ключом CONN_HEALTH_CHECKS настроек БД.
+    """
+    for connection in connections.all():
+        if (connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and connection.connection is not None
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
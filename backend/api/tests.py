@@ -1,10 +1,46 @@
 """Модуль тестов Фудграмю"""
+import asyncio
+import base64
+import json
+import os
+import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
+import psycopg2
+from asgiref.sync import async_to_sync
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.postgresql.base import \
+    DatabaseWrapper as PostgreSQLWrapper
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from .authentication import token_cache
+from .filters import RecipeFilter
+from .indexes import ingredient_index
+from .middleware import RequestTiming
+from .signals import check_persistent_connections
+from .views import IngredientViewSet
+from foodgram_backend.concurrency import async_read_view
+from foodgram_backend.postgresql_pool import base as pool_base
+from foodgram_backend.routers import PIN_COOKIE, REPLICA
+from recipes import images
+from recipes.caches import short_link_cache
+from recipes.models import (Favorite, Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.signals import ingredients_changed
+from recipes.views import recipe_shortlinked_retreave_async
+
 
 class CatsAPITestCase(TestCase):
     """Класс тестов."""
@@ -20,3 +56,1064 @@ class CatsAPITestCase(TestCase):
         """Проверка доступности списка рецептов."""
         response = self.client.get('/api/recipes/')
         self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class ProcessCachesMixin:
+    """Примесь, сбрасывающая кеши процесса перед каждым тестом.
+
+    Кеши в памяти процесса переживают откат транзакции теста, поэтому
+    без сброса результат теста зависел бы от порядка запуска.
+    """
+
+    def setUp(self):
+        """Метод сброса кеша Django и кешей в памяти процесса."""
+        super().setUp()
+        cache.clear()
+        short_link_cache.clear()
+        ingredient_index.invalidate()
+
+
+class RecipeAPITestCase(ProcessCachesMixin, TestCase):
+    """Базовый класс тестов API рецептов."""
+
+    def setUp(self):
+        """Метод подготовки данных к тестам."""
+        super().setUp()
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com')
+        Subscription.objects.create(user=self.user, recipe_author=self.author)
+        self.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        self.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_recipes(self, count):
+        """Метод создания рецептов со всеми связями."""
+        for _ in range(count):
+            recipe = Recipe.objects.create(
+                author=self.author, name='Рецепт', text='Текст',
+                cooking_time=1, image='recipes/images/recipe.png',
+            )
+            recipe.tags.add(self.tag)
+            IngredientInRecipe.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+
+    def count_list_queries(self):
+        """Метод подсчета запросов при получении страницы рецептов."""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', {'limit': 50})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context), response.data['results']
+
+
+class RecipeListQueriesTestCase(RecipeAPITestCase):
+    """Класс тестов количества запросов списков."""
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        """Проверка постоянного числа запросов для страницы рецептов."""
+        self.create_recipes(2)
+        small_page_queries, _ = self.count_list_queries()
+        self.create_recipes(10)
+        large_page_queries, results = self.count_list_queries()
+        self.assertEqual(len(results), 12)
+        self.assertEqual(small_page_queries, large_page_queries)
+        for recipe in results:
+            self.assertTrue(recipe['is_favorited'])
+            self.assertTrue(recipe['is_in_shopping_cart'])
+            self.assertTrue(recipe['author']['is_subscribed'])
+            self.assertEqual(len(recipe['ingredients']), 1)
+
+    def test_subscriptions_queries_do_not_depend_on_page_size(self):
+        """Проверка постоянного числа запросов для страницы подписок."""
+        User = get_user_model()
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(
+                    '/api/users/subscriptions/',
+                    {'limit': 50, 'recipes_limit': 2}
+                )
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            return len(context), response.data['results']
+
+        self.create_recipes(3)
+        small_page_queries, _ = count_queries()
+        for number in range(5):
+            self.author = User.objects.create_user(
+                username=f'author{number}', email=f'author{number}@a.ru')
+            Subscription.objects.create(
+                user=self.user, recipe_author=self.author)
+            self.create_recipes(3)
+        large_page_queries, results = count_queries()
+        self.assertEqual(small_page_queries, large_page_queries)
+        self.assertEqual(len(results), 6)
+        for author in results:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(author['recipes_count'], 3)
+            self.assertEqual(len(author['recipes']), 2)
+
+
+class CursorPaginationTestCase(RecipeAPITestCase):
+    """Класс тестов курсорной пагинации списка рецептов."""
+
+    def test_cursor_pagination_walks_all_recipes(self):
+        """Проверка курсорной пагинации списка рецептов."""
+        self.create_recipes(5)
+        response = self.client.get(
+            '/api/recipes/',
+            {'pagination': 'cursor', 'limit': 2, 'tags': 'breakfast'}
+        )
+        self.assertNotIn('count', response.data)
+        recipe_ids = [recipe['id'] for recipe in response.data['results']]
+        while response.data['next']:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(response.data['next'])
+            recipe_ids += [recipe['id'] for recipe in response.data['results']]
+            self.assertTrue(any(
+                '"recipes_recipe"."published_at" <=' in query['sql']
+                for query in context.captured_queries))
+        self.assertEqual(
+            recipe_ids,
+            list(Recipe.objects.order_by('-published_at', '-id').values_list(
+                'id', flat=True))
+        )
+
+    def test_cursor_pagination_keeps_search_rank_and_ties(self):
+        """Проверка курсора по составному ключу и порядка поиска."""
+        self.create_recipes(5)
+        Recipe.objects.update(published_at=Recipe.objects.first().published_at)
+        Recipe.objects.filter(id=Recipe.objects.order_by('id').first().id
+                              ).update(name='Пирог')
+        Recipe.objects.filter(id=Recipe.objects.order_by('id').last().id
+                              ).update(text='Пирог')
+        expected = list(Recipe.objects.order_by('-id').values_list(
+            'id', flat=True))
+        response = self.client.get(
+            '/api/recipes/', {'pagination': 'cursor', 'limit': 2})
+        pages = [response.data]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data)
+        self.assertEqual([recipe['id'] for page in pages
+                          for recipe in page['results']], expected)
+        response = self.client.get(pages[-1]['previous'])
+        self.assertEqual(response.data['results'], pages[-2]['results'])
+        response = self.client.get(
+            '/api/recipes/',
+            {'pagination': 'cursor', 'limit': 1, 'search': 'Пирог'})
+        self.assertEqual(response.data['results'][0]['id'], expected[-1])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.data['results'][0]['id'], expected[0])
+        self.assertIsNone(response.data['next'])
+
+
+class ShoppingListTestCase(RecipeAPITestCase):
+    """Класс тестов списка покупок."""
+
+    def test_purchase_list_formats(self):
+        """Проверка потоковой выгрузки списка покупок в разных форматах."""
+        self.create_recipes(3)
+        url = '/api/recipes/download_shopping_cart/'
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            b''.join(response.streaming_content).decode(), 'Мука (г) - 3,\n')
+        response = self.client.get(url, {'format': 'csv'})
+        self.assertEqual(
+            b''.join(response.streaming_content).decode().splitlines(),
+            ['name,measurement_unit,amount', 'Мука,г,3'])
+        response = self.client.get(url, {'format': 'json'})
+        self.assertEqual(
+            json.loads(b''.join(response.streaming_content)),
+            [{'name': 'Мука', 'measurement_unit': 'г', 'amount': 3}])
+
+    def test_shopping_list_totals_follow_cart_changes(self):
+        """Проверка поддержки итогов списка покупок при изменениях."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.create(
+            author=self.user, name='Свой', text='Текст',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        recipe.tags.add(self.tag)
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=5)
+        url = f'/api/recipes/{recipe.id}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTPStatus.CREATED)
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 6)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'tags': [self.tag.id],
+             'ingredients': [{'id': self.ingredient.id, 'amount': 2}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 3)
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTPStatus.NO_CONTENT)
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 1)
+        call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+    def test_shopping_list_totals_follow_model_changes(self):
+        """Проверка итогов при изменениях в обход представлений."""
+        self.create_recipes(2)
+        own = Recipe.objects.create(
+            author=self.user, name='Свой', text='Текст',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        row = IngredientInRecipe.objects.create(
+            recipe=own, ingredient=self.ingredient, amount=5)
+        ShoppingCart.objects.create(user=self.user, recipe=own)
+        row.amount = 4
+        row.save()
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 6)
+        self.author.delete()
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 4)
+        own.delete()
+        self.assertFalse(self.user.shopping_list_totals.exists())
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(b''.join(response.streaming_content), b'')
+        call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+
+class RecipeSearchTestCase(RecipeAPITestCase):
+    """Класс тестов поиска рецептов."""
+
+    def test_search_by_name_and_text(self):
+        """Проверка поиска рецептов по названию и тексту."""
+        self.create_recipes(2)
+        Recipe.objects.create(
+            author=self.author, name='Pancakes', text='Milk and flour',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        Recipe.objects.create(
+            author=self.author, name='Omelette', text='Eggs, milk',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        response = self.client.get('/api/recipes/', {'search': 'milk'})
+        self.assertEqual(
+            [recipe['name'] for recipe in response.data['results']],
+            ['Omelette', 'Pancakes']
+        )
+        response = self.client.get('/api/recipes/', {'search': 'pancake'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_postgresql_search_rank_is_double_precision(self):
+        """Проверка точного сравнения ранга поиска с курсором в PostgreSQL.
+
+        Ранг в real не совпал бы со значением float из курсора.
+        """
+        postgresql = PostgreSQLWrapper({
+            'NAME': 'foodgram', 'OPTIONS': {}, 'TIME_ZONE': None,
+        }, 'postgresql-sql')
+        with mock.patch('api.filters.connections',
+                        {'default': mock.Mock(vendor='postgresql')}):
+            queryset = RecipeFilter().filter_search(
+                Recipe.objects.all(), 'search', 'пирог')
+        sql, _ = queryset.filter(search_rank__lt=0.5).query.get_compiler(
+            connection=postgresql).as_sql()
+        self.assertIn('CAST(ts_rank(', sql)
+        self.assertIn('AS double precision) < %s', sql)
+        self.assertIn('CAST(SIMILARITY(', sql)
+
+
+class RecipeConditionalRequestsTestCase(RecipeAPITestCase):
+    """Класс тестов условных запросов рецепта."""
+
+    def test_recipe_retrieve_not_modified(self):
+        """Проверка ответа 304 для неизмененного рецепта."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Favorite.objects.filter(recipe=recipe).delete()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(response.data['is_favorited'])
+
+    def test_recipe_retrieve_with_invalid_id(self):
+        """Проверка ответа 404 для нечислового id рецепта."""
+        response = self.client.get('/api/recipes/abc/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class FeedCacheTestCase(RecipeAPITestCase):
+    """Класс тестов кеша страниц ленты."""
+
+    @override_settings(RECIPES_CACHE_ENABLED=True)
+    def test_feed_page_cache(self):
+        """Проверка кеша страниц ленты и наложения признаков."""
+        self.create_recipes(2)
+        anonymous_client = APIClient()
+        anonymous_client.get('/api/recipes/')
+        with self.assertNumQueries(0):
+            response = anonymous_client.get('/api/recipes/')
+        self.assertFalse(response.data['results'][0]['is_favorited'])
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/recipes/')
+        self.assertTrue(response.data['results'][0]['is_favorited'])
+        self.assertTrue(
+            response.data['results'][0]['author']['is_subscribed'])
+        self.author.first_name = 'Автор'
+        self.author.save()
+        response = anonymous_client.get('/api/recipes/')
+        self.assertEqual(
+            response.data['results'][0]['author']['first_name'], 'Автор')
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                call_command('generate_data', users=1, recipes=1,
+                             favorites=0, cart=0, subscriptions=0, seed=1,
+                             stdout=StringIO())
+        response = anonymous_client.get('/api/recipes/')
+        self.assertEqual(response.data['count'], 3)
+
+
+class ShortLinkTestCase(RecipeAPITestCase):
+    """Класс тестов коротких ссылок."""
+
+    def test_short_link_redirect_is_cached(self):
+        """Проверка перехода по короткой ссылке без запросов к БД."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/s/{recipe.short_link}'
+        self.assertRedirects(self.client.get(url), f'/recipes/{recipe.id}/',
+                             fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        self.client.get('/s/unknown')
+        with self.assertNumQueries(0):
+            response = self.client.get('/s/unknown')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class ImageVariantsTestCase(RecipeAPITestCase):
+    """Класс тестов обработки фото."""
+
+    @staticmethod
+    def create_jpeg_with_exif():
+        """Метод создания фото JPEG с метаданными EXIF."""
+        buffer = BytesIO()
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        Image.new('RGB', (1600, 900), 'red').save(
+            buffer, format='JPEG', exif=exif.tobytes())
+        return buffer.getvalue()
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=0)
+    def test_recipe_image_variants(self):
+        """Проверка создания вариантов фото рецепта."""
+        data = {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 1,
+            'tags': [self.tag.id],
+            'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            'image': ('data:image/jpeg;base64,'
+                      + base64.b64encode(
+                          self.create_jpeg_with_exif()).decode()),
+        }
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(
+                        '/api/recipes/', data, format='json')
+                self.assertEqual(response.status_code, HTTPStatus.CREATED)
+                recipe = Recipe.objects.get(id=response.data['id'])
+                card = recipe.image.storage.open(
+                    recipe.image_variants['card']['webp'])
+                with Image.open(card) as image:
+                    self.assertEqual(image.size, (480, 270))
+                card.close()
+                with recipe.image.open('rb'), Image.open(
+                        recipe.image) as image:
+                    self.assertFalse(image.getexif())
+                output = StringIO()
+                call_command('process_images', '--all', stdout=output)
+                self.assertIn('Обработано изображений: 1, с ошибками: 0',
+                              output.getvalue())
+
+    def test_replaced_image_is_not_overwritten(self):
+        """Проверка, что обработка не затирает замененное фото."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        create_variants = images.create_image_variants
+
+        def replace_image(field_file, sizes):
+            Recipe.objects.filter(id=recipe.id).update(
+                image='recipes/images/new.png')
+            return create_variants(field_file, sizes)
+
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                recipe.image.save('recipe.jpg', ContentFile(
+                    self.create_jpeg_with_exif()))
+                original = recipe.image.name
+                with mock.patch.object(images, 'create_image_variants',
+                                       replace_image):
+                    images.process_recipe_image(recipe.id)
+                _, files = recipe.image.storage.listdir('recipes/images')
+                _, variants = recipe.image.storage.listdir(
+                    'recipes/images/variants')
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'recipes/images/new.png')
+        self.assertEqual(recipe.image_variants, {})
+        self.assertEqual(files, [os.path.basename(original)])
+        self.assertEqual(variants, [])
+
+
+class CountersTestCase(RecipeAPITestCase):
+    """Класс тестов счетчиков."""
+
+    def test_counters_follow_changes(self):
+        """Проверка поддержки счетчиков и их сверки."""
+        self.create_recipes(2)
+        recipe = Recipe.objects.first()
+        stale_recipe = Recipe.objects.get(id=recipe.id)
+        Favorite.objects.filter(recipe=recipe).delete()
+        stale_recipe.name = 'Новое название'
+        stale_recipe.save()
+        recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(self.author.recipes_count, 2)
+        self.assertEqual(self.author.subscribers_count, 1)
+        Recipe.objects.filter(id=recipe.id).update(favorites_count=5)
+        call_command('reconcile_counters', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+
+
+class RecipeOrderingTestCase(RecipeAPITestCase):
+    """Класс тестов сортировок рецептов."""
+
+    def test_popular_and_trending_orderings(self):
+        """Проверка сортировки по популярности и тренду."""
+        self.create_recipes(3)
+        first, second, third = Recipe.objects.order_by('id')
+        Favorite.objects.exclude(recipe=first).delete()
+        ShoppingCart.objects.filter(recipe=third).delete()
+        for ordering in ('popular', 'trending'):
+            call_command('update_trending_scores', stdout=StringIO())
+            response = self.client.get('/api/recipes/',
+                                       {'ordering': ordering})
+            self.assertEqual(
+                [recipe['id'] for recipe in response.data['results']][0],
+                first.id
+            )
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'trending', 'pagination': 'cursor'})
+        self.assertEqual(response.data['results'][0]['id'], first.id)
+
+    @override_settings(RECIPES_CACHE_ENABLED=True)
+    def test_counter_orderings_with_ties(self):
+        """Проверка курсора при равных значениях и свежести порядка."""
+        self.create_recipes(5)
+        Favorite.objects.all().delete()
+        for ordering in ('cooking_time', 'popular', 'trending'):
+            response = self.client.get('/api/recipes/', {
+                'ordering': ordering, 'pagination': 'cursor', 'limit': 2})
+            recipe_ids = [recipe['id'] for recipe in response.data['results']]
+            while response.data['next']:
+                response = self.client.get(response.data['next'])
+                recipe_ids += [
+                    recipe['id'] for recipe in response.data['results']]
+            self.assertEqual(sorted(recipe_ids), sorted(
+                Recipe.objects.values_list('id', flat=True)))
+        anonymous_client = APIClient()
+        anonymous_client.get('/api/recipes/', {'ordering': 'popular'})
+        last = Recipe.objects.order_by('id').first()
+        Favorite.objects.create(user=self.user, recipe=last)
+        response = anonymous_client.get('/api/recipes/',
+                                        {'ordering': 'popular'})
+        self.assertEqual(response.data['results'][0]['id'], last.id)
+
+
+class FollowedFeedTestCase(RecipeAPITestCase):
+    """Класс тестов ленты подписок."""
+
+    def test_feed_contains_only_followed_authors(self):
+        """Проверка ленты рецептов авторов из подписок."""
+        self.create_recipes(3)
+        followed_ids = set(Recipe.objects.values_list('id', flat=True))
+        self.author = get_user_model().objects.create_user(
+            username='stranger', email='stranger@example.com')
+        self.create_recipes(2)
+        response = self.client.get('/api/recipes/feed/', {'limit': 2})
+        recipe_ids = [recipe['id'] for recipe in response.data['results']]
+        response = self.client.get(response.data['next'])
+        recipe_ids += [recipe['id'] for recipe in response.data['results']]
+        self.assertIsNone(response.data['next'])
+        self.assertEqual(set(recipe_ids), followed_ids)
+        self.assertEqual(recipe_ids, sorted(recipe_ids, reverse=True))
+
+
+class BatchEndpointsTestCase(RecipeAPITestCase):
+    """Класс тестов пакетного изменения корзины и избранного."""
+
+    def test_batch_shopping_cart_and_favorites(self):
+        """Проверка пакетного изменения корзины и избранного."""
+        self.create_recipes(3)
+        first, second, third = Recipe.objects.order_by('id')
+        ShoppingCart.objects.filter(recipe__in=(first, second)).delete()
+        Favorite.objects.filter(recipe__in=(first, second)).delete()
+        ids = [first.id, second.id, third.id, 10 ** 6]
+        response = self.client.post('/api/recipes/shopping_cart/',
+                                    {'recipes': ids}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['created', 'created', 'exists', 'not_found']
+        )
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 3)
+        response = self.client.delete('/api/recipes/shopping_cart/',
+                                      {'recipes': ids[:2]}, format='json')
+        self.assertEqual(
+            self.user.shopping_list_totals.get().total_amount, 1)
+        self.client.post('/api/recipes/favorite/',
+                         {'recipes': ids}, format='json')
+        first.refresh_from_db()
+        self.assertEqual(first.favorites_count, 1)
+        call_command('rebuild_shopping_lists', '--verify', stdout=StringIO())
+
+    def test_batch_favorites_concurrent_insert(self):
+        """Проверка пакетного избранного при параллельной вставке."""
+        self.create_recipes(2)
+        first, second = Recipe.objects.order_by('id')
+        Favorite.objects.all().delete()
+        bulk_create = Favorite.objects.bulk_create
+
+        def concurrent_bulk_create(records, **kwargs):
+            Favorite.objects.create(user=self.user, recipe=first)
+            return bulk_create(records, **kwargs)
+
+        with mock.patch.object(Favorite.objects, 'bulk_create',
+                               concurrent_bulk_create):
+            response = self.client.post(
+                '/api/recipes/favorite/',
+                {'recipes': [first.id, second.id]}, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data['results']],
+            ['exists', 'created']
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.favorites_count, second.favorites_count),
+                         (1, 1))
+
+
+class RecipeUpdateTestCase(RecipeAPITestCase):
+    """Класс тестов изменения рецепта."""
+
+    def test_recipe_update_changes_only_ingredient_diff(self):
+        """Проверка изменения только отличающихся ингредиентов рецепта."""
+        sugar = Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=self.user, name='Свой', text='Текст',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        recipe.tags.add(self.tag)
+        kept = IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=self.ingredient, amount=5)
+        IngredientInRecipe.objects.create(
+            recipe=recipe, ingredient=sugar, amount=3)
+        diffs = []
+
+        def collect(sender, **kwargs):
+            diffs.append({key: kwargs[key]
+                          for key in ('added', 'changed', 'removed')})
+
+        ingredients_changed.connect(collect)
+        self.addCleanup(ingredients_changed.disconnect, collect)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'tags': [self.tag.id],
+             'ingredients': [{'id': self.ingredient.id, 'amount': 2},
+                             {'id': salt.id, 'amount': 1}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(diffs, [{'added': {salt.id: 1},
+                                  'changed': {self.ingredient.id: (5, 2)},
+                                  'removed': {sugar.id: 3}}])
+        kept.refresh_from_db()
+        self.assertEqual(kept.amount, 2)
+        self.assertEqual(
+            set(recipe.ingredientinrecipe.values_list('ingredient_id',
+                                                      flat=True)),
+            {self.ingredient.id, salt.id}
+        )
+
+
+class DataTransferTestCase(RecipeAPITestCase):
+    """Класс тестов загрузки и выгрузки данных."""
+
+    def test_import_data_upserts_ingredients(self):
+        """Проверка повторного импорта с обновлением единиц измерения."""
+        for name in ('Сахар', 'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        with tempfile.NamedTemporaryFile(
+                'w', suffix='.json', encoding='utf-8') as file:
+            json.dump([{'name': 'Соль', 'measurement_unit': 'щепотка'},
+                       {'name': 'Перец', 'measurement_unit': 'г'},
+                       {'name': '', 'measurement_unit': 'г'},
+                       {'name': 'Сахар', 'measurement_unit': 'г'}], file)
+            file.flush()
+            out = StringIO()
+            call_command('import_data', file.name, '--batch-size', '2',
+                         stdout=out)
+        self.assertIn('добавлено 1, обновлено 1, пропущено 2',
+                      out.getvalue())
+        self.assertEqual(
+            Ingredient.objects.get(name='Соль').measurement_unit, 'щепотка')
+
+    def test_export_and_import_recipes(self):
+        """Проверка переноса рецептов выгрузкой и загрузкой."""
+        buffer = BytesIO()
+        Image.new('RGB', (8, 8), 'red').save(buffer, format='PNG')
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                self.create_recipes(2)
+                recipe = Recipe.objects.earliest('id')
+                recipe.image.save('recipe.png', ContentFile(
+                    buffer.getvalue()))
+                path = f'{media_root}/recipes.ndjson.gz'
+                call_command('export_recipes', path, '--batch-size', '1',
+                             stderr=StringIO(), stdout=StringIO())
+                short_link, published_at = recipe.short_link, \
+                    recipe.published_at
+                Recipe.objects.all().delete()
+                self.author.delete()
+                out = StringIO()
+                call_command('import_recipes', path, '--workers', '2',
+                             stdout=out)
+                self.assertIn('рецептов добавлено 2, пропущено 0',
+                              out.getvalue())
+                recipe = Recipe.objects.get(short_link=short_link)
+                self.assertEqual(recipe.published_at, published_at)
+                self.assertEqual(recipe.author.recipes_count, 2)
+                self.assertEqual(list(recipe.tags.all()), [self.tag])
+                self.assertEqual(
+                    list(recipe.ingredientinrecipe.values_list(
+                        'ingredient__name', 'amount')), [('Мука', 1)])
+                with Image.open(recipe.image.open()) as image:
+                    self.assertEqual(image.size, (8, 8))
+                recipe.image.close()
+                out = StringIO()
+                call_command('import_recipes', path, stdout=out)
+                self.assertIn('рецептов добавлено 0, пропущено 2',
+                              out.getvalue())
+
+    def test_import_recipes_skips_images_without_name(self):
+        """Проверка пропуска записей с данными фото без имени файла."""
+        record = {'type': 'recipe', 'name': 'Суп', 'text': 'Сварить.',
+                  'cooking_time': 5, 'author': self.author.username,
+                  'image_data': base64.b64encode(b'data').decode()}
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                path = f'{media_root}/recipes.ndjson'
+                with open(path, 'w', encoding='utf-8') as file:
+                    for number, image in enumerate((None, '')):
+                        file.write(json.dumps(
+                            {**record, 'image': image,
+                             'short_link': f'link{number}'}) + '\n')
+                out = StringIO()
+                call_command('import_recipes', path, '--workers', '0',
+                             stdout=out)
+        self.assertIn('рецептов добавлено 0, пропущено 2', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+
+class DataGenerationTestCase(ProcessCachesMixin, TestCase):
+    """Класс тестов генерации данных и замера API."""
+
+    def test_generate_data_and_benchmark(self):
+        """Проверка генерации данных и замера эндпоинтов."""
+        with tempfile.TemporaryDirectory() as media_root:
+            with self.settings(MEDIA_ROOT=media_root):
+                call_command('generate_data', '--users', '5', '--recipes',
+                             '20', '--seed', '1', stdout=StringIO())
+                self.assertEqual(Recipe.objects.count(), 20)
+                self.assertEqual(
+                    Recipe.objects.filter(ingredientinrecipe=None).count(),
+                    0)
+                path = f'{media_root}/benchmark.json'
+                call_command('benchmark_api', '--iterations', '2',
+                             '--warmup', '0', '--output', path,
+                             stdout=StringIO())
+                with open(path, encoding='utf-8') as file:
+                    endpoints = json.load(file)['endpoints']
+        self.assertEqual(endpoints['recipe_retrieve']['status_codes'],
+                         {'200': 2})
+        self.assertIn('p95', endpoints['recipes_list']['latency_ms'])
+
+
+class QueryTimingTestCase(RecipeAPITestCase):
+    """Класс тестов замеров запросов."""
+
+    @override_settings(QUERY_TIMING_ENABLED=True, QUERY_BUDGET=1)
+    def test_query_timing_middleware(self):
+        """Проверка замеров запросов и поиска повторяющихся запросов."""
+        self.create_recipes(3)
+        with self.assertLogs('api.timing', 'WARNING') as logs:
+            response = self.client.get('/api/recipes/')
+        self.assertRegex(response['Server-Timing'],
+                         r'db;dur=[\d.]+;desc="\d+ queries", '
+                         r'serializer;dur=[\d.]+, view;dur=[\d.]+')
+        self.assertTrue(json.loads(logs.records[0].getMessage())[
+            'over_budget'])
+
+        class AuthorSerializer(serializers.Serializer):
+            author = serializers.SerializerMethodField()
+
+            def get_author(self, obj):
+                return obj.author.username
+
+        timing = RequestTiming()
+        with connection.execute_wrapper(timing):
+            AuthorSerializer(Recipe.objects.all(), many=True).data
+        [repeated] = timing.get_repeated()
+        self.assertEqual((repeated['count'], repeated['field']),
+                         (3, 'AuthorSerializer.author'))
+
+
+class SparseFieldsetsTestCase(RecipeAPITestCase):
+    """Класс тестов выбора полей ответа."""
+
+    def test_sparse_fieldsets(self):
+        """Проверка выбора полей и связей параметрами запроса."""
+        self.create_recipes(2)
+        full_queries, _ = self.count_list_queries()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/',
+                {'fields': 'name,cooking_time,author,tags', 'expand': ''})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        recipe = response.data['results'][0]
+        self.assertEqual(set(recipe), {'id', 'name', 'cooking_time',
+                                       'author', 'tags'})
+        self.assertEqual(recipe['author'], self.author.id)
+        self.assertEqual(recipe['tags'], [self.tag.id])
+        self.assertLess(len(context), full_queries)
+        sql = ' '.join(query['sql'] for query in context.captured_queries)
+        self.assertNotIn('"text"', sql)
+        self.assertNotIn('recipes_ingredientinrecipe', sql)
+        response = self.client.get(
+            '/api/recipes/',
+            {'omit': 'text,tags', 'expand': 'ingredients'})
+        recipe = response.data['results'][0]
+        self.assertNotIn('text', recipe)
+        self.assertEqual(recipe['author'], self.author.id)
+        self.assertEqual(recipe['ingredients'][0]['name'], 'Мука')
+        self.assertTrue(recipe['is_favorited'])
+        response = self.client.get(
+            '/api/users/subscriptions/', {'fields': 'username,recipes',
+                                          'expand': ''})
+        self.assertEqual(response.data['results'][0]['recipes'],
+                         list(self.author.recipes.values_list(
+                             'id', flat=True)))
+        response = self.client.get('/api/recipes/', {'fields': 'unknown'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+
+class IngredientSearchTestCase(ProcessCachesMixin, TestCase):
+    """Класс тестов поиска ингредиентов."""
+
+    def setUp(self):
+        """Метод подготовки данных к тестам."""
+        super().setUp()
+        for name in ('Сахар', 'сахарная пудра', 'Тростниковый сахар',
+                     'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        self.client = APIClient()
+
+    def test_prefix_then_contains_from_index(self):
+        """Проверка порядка результатов и поиска по индексу.
+
+        Единственный запрос к БД - версия справочника для ETag.
+        """
+        self.client.get('/api/ingredients/', {'name': 'с'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/ingredients/', {'name': 'сах'})
+        self.assertEqual(
+            [ingredient['name'] for ingredient in response.data],
+            ['Сахар', 'сахарная пудра', 'Тростниковый сахар']
+        )
+        Ingredient.objects.create(name='Сахарин', measurement_unit='г')
+        response = self.client.get('/api/ingredients/', {'name': 'сахари'})
+        self.assertEqual(response.data[0]['name'], 'Сахарин')
+
+
+class CatalogueCachingTestCase(ProcessCachesMixin, TestCase):
+    """Класс тестов HTTP кеширования справочников."""
+
+    def test_tags_not_modified_until_changed(self):
+        """Проверка ответа 304 до изменения тегов."""
+        client = APIClient()
+        tag = Tag.objects.create(name='Обед', slug='lunch')
+        etag = client.get('/api/tags/')['ETag']
+        with self.assertNumQueries(1):
+            response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        tag.name = 'Ужин'
+        tag.save()
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_ingredient_search_not_modified_until_changed(self):
+        """Проверка ответа 304 для поиска ингредиентов по названию."""
+        client = APIClient()
+        Ingredient.objects.create(name='Мука', measurement_unit='г')
+        params = {'name': 'му'}
+        etag = client.get('/api/ingredients/', params)['ETag']
+        response = client.get('/api/ingredients/', params,
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Ingredient.objects.create(name='Мускат', measurement_unit='г')
+        response = client.get('/api/ingredients/', params,
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.data), 2)
+
+
+class TokenCacheTestCase(ProcessCachesMixin, TestCase):
+    """Класс тестов кеша токенов аутентификации."""
+
+    def test_token_cache_saves_query_and_is_invalidated(self):
+        """Проверка кеша токенов и его сброса при выходе и деактивации."""
+        user = get_user_model().objects.create_user(
+            username='cook', email='cook@example.com', password='Pa55word!')
+        client = APIClient()
+
+        def login():
+            client.credentials()
+            token = client.post('/api/auth/token/login/', {
+                'email': 'cook@example.com', 'password': 'Pa55word!'
+            }).data['auth_token']
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+        login()
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(client.get('/api/users/me/').status_code,
+                             HTTPStatus.OK)
+        with CaptureQueriesContext(connection) as second:
+            self.assertEqual(client.get('/api/users/me/').status_code,
+                             HTTPStatus.OK)
+        self.assertEqual(len(second), len(first) - 1)
+        client.post('/api/auth/token/logout/')
+        self.assertEqual(client.get('/api/users/me/').status_code,
+                         HTTPStatus.UNAUTHORIZED)
+        login()
+        client.get('/api/users/me/')
+        user.is_active = False
+        user.save()
+        self.assertEqual(client.get('/api/users/me/').status_code,
+                         HTTPStatus.UNAUTHORIZED)
+
+    def test_token_cache_returns_fresh_users(self):
+        """Проверка, что кеш токенов выдает новый экземпляр пользователя."""
+        user = get_user_model().objects.create_user(
+            username='cook', email='cook@example.com')
+        token = Token.objects.create(user=user)
+        token_cache.set(token.key, user, token)
+        first, _ = token_cache.get(token.key)
+        second, _ = token_cache.get(token.key)
+        self.assertEqual(first, user)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first._state, second._state)
+        self.assertIsNotNone(cache.get(token_cache.make_key(token.key)))
+        token_cache.invalidate_user(user.id)
+        self.assertIsNone(token_cache.get(token.key))
+
+
+class AsyncViewsTestCase(ProcessCachesMixin, TransactionTestCase):
+    """Класс тестов асинхронных представлений чтения.
+
+    Представления выполняются в потоках пула со своими соединениями
+    с БД, поэтому данные должны быть зафиксированы.
+    """
+
+    def test_async_read_views(self):
+        """Проверка ответов асинхронных представлений."""
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        view = async_read_view(IngredientViewSet.as_view({'get': 'list'}))
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        response = async_to_sync(view)(
+            RequestFactory().get('/api/ingredients/', {'name': 'сах'}))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(json.loads(response.content)[0]['name'], 'Сахар')
+        author = get_user_model().objects.create_user(
+            username='author', email='author@example.com')
+        recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст', cooking_time=1,
+            image='recipes/images/recipe.png',
+        )
+        request = RequestFactory().get(f'/s/{recipe.short_link}')
+        for _ in range(2):
+            response = async_to_sync(recipe_shortlinked_retreave_async)(
+                request, recipe.short_link)
+            self.assertEqual(response.url, f'/recipes/{recipe.id}/')
+        response = async_to_sync(recipe_shortlinked_retreave_async)(
+            RequestFactory().get('/s/unknown'), 'unknown')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(
+    DATABASE_ROUTERS=['foodgram_backend.routers.ReplicaRouter'])
+class ReplicaRoutingTestCase(ProcessCachesMixin, TransactionTestCase):
+    """Класс тестов чтения с реплики БД.
+
+    Реплика - второе соединение с той же тестовой БД, поэтому
+    запросы к ней видны отдельно от запросов к основной.
+    """
+
+    def setUp(self):
+        connections.databases[REPLICA] = dict(
+            connections['default'].settings_dict)
+        super().setUp()
+        self.user = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com')
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com')
+        Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=1, image='recipes/images/recipe.png',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def get_replica_queries(self, url):
+        """Метод получения числа запросов к реплике при GET."""
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(queries)
+
+    def test_safe_requests_read_from_replica_until_write(self):
+        """Проверка чтения с реплики и закрепления после записи."""
+        self.assertGreater(self.get_replica_queries('/api/recipes/'), 0)
+        self.assertGreater(
+            self.get_replica_queries('/api/users/subscriptions/'), 0)
+        self.assertEqual(self.get_replica_queries('/api/users/me/'), 0)
+        response = self.client.post(
+            f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            self.get_replica_queries('/api/users/subscriptions/'), 0)
+        self.client.cookies.clear()
+        self.assertEqual(self.get_replica_queries('/api/recipes/'), 0)
+        cache.clear()
+        self.assertGreater(self.get_replica_queries('/api/recipes/'), 0)
+
+    @override_settings(RECIPES_CACHE_ENABLED=True)
+    def test_replica_pages_are_cached_after_replication_lag(self):
+        """Проверка кеширования страниц с реплики после задержки."""
+        uncached = self.get_replica_queries('/api/recipes/')
+        self.assertEqual(self.get_replica_queries('/api/recipes/'), uncached)
+        with override_settings(REPLICA_PIN_SECONDS=0):
+            self.assertEqual(self.get_replica_queries('/api/recipes/'),
+                             uncached)
+            self.assertLess(self.get_replica_queries('/api/recipes/'),
+                            uncached)
+        Recipe.objects.get().save()
+        self.assertEqual(self.get_replica_queries('/api/recipes/'), uncached)
+        self.assertEqual(self.get_replica_queries('/api/recipes/'), uncached)
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertEqual(self.get_replica_queries('/api/recipes/'), 0)
+        self.client.cookies.clear()
+        self.assertLess(self.get_replica_queries('/api/recipes/'), uncached)
+
+
+class FakeConnectionPool:
+    """Класс пула соединений psycopg2 без сервера БД."""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self.usable = True
+        self.closed = 0
+
+    def getconn(self):
+        connection = mock.MagicMock(isolation_level=1)
+        if not self.usable:
+            connection.cursor.side_effect = psycopg2.OperationalError
+        return connection
+
+    def putconn(self, connection, close=False):
+        self.closed += close
+
+
+@mock.patch.object(pool_base, 'ThreadedConnectionPool', FakeConnectionPool)
+@mock.patch('psycopg2.extras.register_default_jsonb', mock.Mock())
+class ConnectionPoolTestCase(SimpleTestCase):
+    """Класс тестов бэкенда PostgreSQL с пулом соединений."""
+
+    def setUp(self):
+        self.wrapper = pool_base.DatabaseWrapper({
+            'OPTIONS': {}, 'CONN_HEALTH_CHECKS': True,
+            'POOL': {'MAX_SIZE': 2, 'TIMEOUT': 0},
+        }, alias='pool-test')
+        self.addCleanup(pool_base._pools.pop, 'pool-test', None)
+        self.addCleanup(pool_base._slots.pop, 'pool-test', None)
+
+    def test_failed_health_checks_raise_error(self):
+        """Проверка ошибки, если ни одно соединение не прошло проверку."""
+        pool = self.wrapper.get_pool({})
+        pool.usable = False
+        with self.assertRaises(psycopg2.OperationalError):
+            self.wrapper.get_new_connection({})
+        self.assertEqual(pool.closed, pool.maxconn + 1)
+        pool.usable = True
+        self.assertIsNotNone(self.wrapper.get_new_connection({}))
+
+    def test_exhausted_pool_waits_for_connection(self):
+        """Проверка ожидания свободного соединения в пуле."""
+        connections = [self.wrapper.get_new_connection({})
+                       for _ in range(2)]
+        with self.assertRaisesMessage(psycopg2.OperationalError,
+                                      'Нет свободных соединений'):
+            self.wrapper.get_new_connection({})
+        self.wrapper.connection = connections.pop()
+        self.wrapper._close()
+        self.assertIsNotNone(self.wrapper.get_new_connection({}))
+
+
+class PersistentConnectionsTestCase(SimpleTestCase):
+    """Класс тестов проверки постоянных соединений перед запросом."""
+
+    def check(self, health_checks=True, in_atomic_block=False,
+              usable=False):
+        """Метод вызова проверки для одного соединения."""
+        connection = mock.Mock(
+            settings_dict={'CONN_HEALTH_CHECKS': health_checks},
+            in_atomic_block=in_atomic_block)
+        connection.is_usable.return_value = usable
+        with mock.patch('api.signals.connections') as connections:
+            connections.all.return_value = [connection]
+            check_persistent_connections()
+        return connection.close.called
+
+    def test_only_broken_idle_connections_are_closed(self):
+        """Проверка закрытия только разорванных соединений вне транзакции."""
+        self.assertTrue(self.check())
+        self.assertFalse(self.check(usable=True))
+        self.assertFalse(self.check(health_checks=False))
+        self.assertFalse(self.check(in_atomic_block=True))
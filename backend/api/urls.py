@@ -1,7 +1,9 @@
 """Модуль маршрутизаторов приложения Foodgram."""
-from django.urls import include, path
+from django.conf import settings
+from django.urls import URLPattern, include, path
 from rest_framework import routers
 
+from foodgram_backend.concurrency import async_read_view
 from .views import (FoodgramUserViewSet, IngredientViewSet, RecipesViewSet,
                     TagViewSet)
 
@@ -11,7 +13,24 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipesViewSet, basename='recipes')
 router.register('users', FoodgramUserViewSet, basename='users')
 
+# Маршруты чтения, которые при ASYNC_VIEWS обслуживаются асинхронно.
+ASYNC_READ_ROUTES = ('recipes-list', 'recipes-detail', 'ingredients-list',
+                     'ingredients-detail')
+
+
+def get_router_urls():
+    """Функция получения маршрутов с асинхронными представлениями чтения."""
+    if not settings.ASYNC_VIEWS:
+        return router.urls
+    return [
+        URLPattern(url.pattern, async_read_view(url.callback),
+                   url.default_args, url.name)
+        if url.name in ASYNC_READ_ROUTES else url
+        for url in router.urls
+    ]
+
+
 urlpatterns = [
-    path('', include(router.urls)),
+    path('', include(get_router_urls())),
     path('auth/', include('djoser.urls.authtoken')),
 ]
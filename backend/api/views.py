@@ -1,6 +1,14 @@
 """Модуль представлений приложения api."""
-from django.db.models import Count, Sum
-from django.http import FileResponse
+import csv
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import (Exists, F, OuterRef, Prefetch, Subquery,
+                              Value)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
@@ -9,24 +17,43 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .caches import recipe_feed_cache
+from .fieldsets import Fieldset
 from .filters import IngredientFilter, RecipeFilter
-from .paginators import RecipesPageNumberPagination
+from .indexes import ingredient_index
+from .mixins import (ConditionalResponseMixin, ReplicaReadMixin,
+                     VersionedCatalogueMixin)
+from .paginators import (RecipesCursorPagination,
+                         RecipesPageNumberPagination)
 from .permissions import IsOwnerOrReadOnly
+from .renderers import CSVRenderer, PlainTextRenderer
 from .serializers import (FavoriteRecipesSerializer, FoodgramUserSerializer,
                           IngredientSerializer, RecipeGetSerializer,
+                          RecipeGetShortSerializer, RecipeIdsSerializer,
                           RecipesSerializer, ShoppingCartSerializer,
                           SubscriptionPostSerializer,
                           SubscriptionGetSerializer, TagSerializer)
-from recipes.models import (Favorite, FoodgramUser, Ingredient,
-                            IngredientInRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes.images import delete_image_variants
+from recipes.models import (ContentVersion, Favorite, FoodgramUser,
+                            Ingredient, Recipe, ShoppingCart,
+                            ShoppingListTotal, Subscription, Tag)
+
+
+class PurchaseLine:
+    """Псевдобуфер, возвращающий записанную строку CSV."""
+
+    def write(self, value):
+        """Метод возврата строки вместо записи в буфер."""
+        return value
 
 
-class FoodgramUserViewSet(UserViewSet):
+class FoodgramUserViewSet(ReplicaReadMixin, UserViewSet):
     """Класс представления CustomUserViewSet."""
 
+    replica_actions = ('subscriptions',)
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = FoodgramUser.objects.all()
     serializer_class = FoodgramUserSerializer
@@ -58,7 +85,10 @@ class FoodgramUserViewSet(UserViewSet):
     @avatar.mapping.delete
     def delete_avatar(self, request, id=None):
         """Метод удаления аватара."""
-        request.user.avatar.delete()
+        user = request.user
+        delete_image_variants(user.avatar, user.avatar_variants)
+        user.avatar_variants = {}
+        user.avatar.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=('post',), url_path='subscribe')
@@ -87,32 +117,66 @@ class FoodgramUserViewSet(UserViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=('get',), url_path='subscriptions')
+    @action(detail=False, methods=('get',), url_path='subscriptions',
+            permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        """Метод для вывода подписок."""
+        """Метод для вывода подписок.
+
+        Ограниченные списки рецептов всех авторов страницы загружаются
+        одним запросом с подзапросом LIMIT для каждого автора.
+        Параметры fields, omit и expand выбирают поля ответа, рецепты
+        загружаются, только если они выводятся.
+        """
+        fieldset = Fieldset.from_request(request, SubscriptionGetSerializer)
         queryset = FoodgramUser.objects.filter(
             author_subscriptions__user_id=request.user).order_by(
-            'last_name').annotate(recipes_count=Count('recipes'))
+            'last_name').annotate(is_subscribed=Value(True))
+        if 'recipes' in fieldset:
+            recipes = Recipe.objects.only(
+                'id', 'author', *(('name', 'image', 'image_variants',
+                                   'cooking_time')
+                                  if fieldset.expands('recipes') else ()))
+            recipes_limit = SubscriptionGetSerializer.get_recipes_limit(
+                request)
+            if recipes_limit is not None:
+                recipes = recipes.filter(id__in=Subquery(
+                    Recipe.objects.filter(
+                        author_id=OuterRef('author_id')
+                    ).values('id')[:max(recipes_limit, 0)]
+                ))
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes', queryset=recipes, to_attr='limited_recipes'))
+        if fieldset.sparse:
+            queryset = queryset.only('id', *(
+                name for name in ('email', 'username', 'first_name',
+                                  'last_name', 'avatar', 'avatar_variants',
+                                  'recipes_count')
+                if name in fieldset
+            ))
         serializer = SubscriptionGetSerializer(
             self.paginate_queryset(queryset),
-            context={'request': request},
+            context={'request': request, 'fieldset': fieldset},
             many=True
         )
         return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, VersionedCatalogueMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Класс представления тегов."""
 
+    version_name = ContentVersion.TAGS
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, VersionedCatalogueMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Класс представления ингредиентов."""
 
+    version_name = ContentVersion.INGREDIENTS
     permission_classes = (IsAuthenticatedOrReadOnly,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -120,24 +184,249 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        """Метод получения ингредиентов с поиском по названию.
 
-class RecipesViewSet(viewsets.ModelViewSet):
+        Поиск по названию идет по индексу в памяти процесса, к БД
+        обращается только проверка версии справочника для ETag.
+        """
+        if request.query_params.get('name') is None:
+            return super().list(request, *args, **kwargs)
+        return self.conditional_response(self.search, request,
+                                         *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        """Метод поиска ингредиентов по индексу названий."""
+        return Response(ingredient_index.search(request.query_params['name']))
+
+
+class RecipesViewSet(ReplicaReadMixin, ConditionalResponseMixin,
+                     viewsets.ModelViewSet):
     """Класс создания рецептов."""
 
     permission_classes = (IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly)
-    queryset = Recipe.objects.select_related('author').prefetch_related(
-        'tags', 'ingredients')
+    queryset = Recipe.objects.all()
     lookup_field = 'id'
     pagination_class = RecipesPageNumberPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    fieldset_actions = ('list', 'retrieve', 'feed')
+    deferrable_columns = ('name', 'image', 'image_variants', 'text')
+    required_columns = ('id', 'author', 'cooking_time', 'published_at',
+                        'favorites_count', 'trending_score')
+
+    @property
+    def paginator(self):
+        """Метод выбора пагинации.
+
+        Курсорная пагинация используется для ленты подписок, а для
+        списка рецептов включается параметром запроса pagination=cursor,
+        наличием курсора в запросе или настройкой
+        RECIPES_CURSOR_PAGINATION.
+        """
+        if not hasattr(self, '_paginator'):
+            query_params = self.request.query_params
+            if (self.action == 'feed'
+                    or settings.RECIPES_CURSOR_PAGINATION
+                    or query_params.get('pagination') == 'cursor'
+                    or RecipesCursorPagination.cursor_query_param
+                    in query_params):
+                self._paginator = RecipesCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_fieldset(self):
+        """Метод получения набора полей ответа.
+
+        Параметры fields, omit и expand учитываются только при чтении
+        рецептов, остальные действия выводят рецепт целиком.
+        """
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = (
+                Fieldset.from_request(self.request, RecipeGetSerializer)
+                if self.action in self.fieldset_actions
+                else Fieldset(RecipeGetSerializer.Meta.fields)
+            )
+        return self._fieldset
+
+    def get_serializer_context(self):
+        """Метод передачи набора полей в контекст сериализатора."""
+        context = super().get_serializer_context()
+        if self.action in self.fieldset_actions:
+            context['fieldset'] = self.get_fieldset()
+        return context
+
+    def get_queryset(self):
+        """Метод получения рецептов с признаками для пользователя.
+
+        Признаки избранного, корзины и подписки на автора вычисляются
+        подзапросами для всей страницы сразу, а не отдельным запросом
+        на каждый рецепт. Связи и колонки, не попавшие в набор полей
+        ответа, не загружаются.
+        """
+        queryset = super().get_queryset()
+        fieldset = self.get_fieldset()
+        user = self.request.user
+        if fieldset.expands('author'):
+            queryset = (queryset.select_related('author')
+                        if not user.is_authenticated
+                        else queryset.prefetch_related(Prefetch(
+                            'author', queryset=FoodgramUser.objects.annotate(
+                                is_subscribed=Exists(
+                                    Subscription.objects.filter(
+                                        user_id=user.id,
+                                        recipe_author_id=OuterRef('pk')
+                                    ))
+                            ))))
+        if 'tags' in fieldset:
+            queryset = queryset.prefetch_related('tags')
+        if fieldset.expands('ingredients'):
+            queryset = queryset.prefetch_related(
+                'ingredientinrecipe__ingredient')
+        elif 'ingredients' in fieldset:
+            queryset = queryset.prefetch_related('ingredientinrecipe')
+        if user.is_authenticated:
+            queryset = queryset.annotate(**{
+                name: annotation for name, annotation
+                in self.get_user_annotations().items() if name in fieldset
+            })
+        if fieldset.sparse:
+            queryset = queryset.only(*self.required_columns, *(
+                column for column in self.deferrable_columns
+                if column in fieldset
+            ))
+        return queryset
+
+    def get_user_annotations(self):
+        """Метод получения подзапросов признаков рецепта для пользователя."""
+        user_id = self.request.user.id
+        return {
+            'is_favorited': Exists(Favorite.objects.filter(
+                user_id=user_id, recipe_id=OuterRef('pk')
+            )),
+            'is_in_shopping_cart': Exists(ShoppingCart.objects.filter(
+                user_id=user_id, recipe_id=OuterRef('pk')
+            )),
+        }
+
+    def get_conditional_validators(self, request, *args, **kwargs):
+        """Метод получения ETag и даты изменения рецепта.
+
+        ETag учитывает дату изменения рецепта, версии тегов,
+        ингредиентов и пользователей, а для авторизованного
+        пользователя и его признаки избранного, корзины и подписки.
+        Дата изменения для авторизованного пользователя не
+        возвращается, так как не отражает изменение признаков.
+        """
+        if (self.action != 'retrieve'
+                or not str(kwargs.get('id', '')).isdigit()):
+            return None
+        annotations = {}
+        if request.user.is_authenticated:
+            annotations = self.get_user_annotations()
+            annotations['is_subscribed'] = Exists(
+                Subscription.objects.filter(
+                    user_id=request.user.id,
+                    recipe_author_id=OuterRef('author_id')
+                )
+            )
+        recipe = Recipe.objects.filter(id=kwargs.get('id')).annotate(
+            **annotations).values_list('updated_at', *annotations).first()
+        if recipe is None:
+            return None
+        updated_at, *flags = recipe
+        versions = ContentVersion.objects.get_versions((
+            ContentVersion.TAGS, ContentVersion.INGREDIENTS,
+            ContentVersion.USERS,
+        )).values()
+        etag = '-'.join(
+            (kwargs.get('id'), str(updated_at.timestamp()))
+            + tuple(str(version) for version, _ in versions)
+            + tuple(str(int(flag)) for flag in flags)
+        ) + self.get_fieldset().key
+        if request.user.is_authenticated:
+            return etag, None
+        return etag, max((updated_at, *(
+            version_updated_at for _, version_updated_at in versions
+            if version_updated_at
+        )))
+
+    def list(self, request, *args, **kwargs):
+        """Метод получения списка рецептов через кеш страниц.
+
+        Авторизованному пользователю страница из кеша возвращается
+        с его признаками избранного, корзины и подписки.
+        """
+        if not recipe_feed_cache.is_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        data = recipe_feed_cache.get(request)
+        if data is None:
+            read_at = time.time_ns()
+            response = super().list(request, *args, **kwargs)
+            recipe_feed_cache.set(request, response.data, read_at)
+            return response
+        if request.user.is_authenticated:
+            self.overlay_user_flags(data['results'])
+        return Response(data)
+
+    def overlay_user_flags(self, recipes):
+        """Метод установки признаков пользователя в рецептах страницы.
+
+        Запрашиваются только признаки, вошедшие в набор полей ответа.
+        """
+        user = self.request.user
+        fieldset = self.get_fieldset()
+        recipe_ids = [recipe['id'] for recipe in recipes]
+        flags = {}
+        if 'is_favorited' in fieldset:
+            flags['is_favorited'] = set(user.favorite_recipe.filter(
+                recipe_id__in=recipe_ids).values_list('recipe_id', flat=True))
+        if 'is_in_shopping_cart' in fieldset:
+            flags['is_in_shopping_cart'] = set(
+                user.shopping_cart_recipe.filter(
+                    recipe_id__in=recipe_ids
+                ).values_list('recipe_id', flat=True))
+        for recipe in recipes:
+            for name, recipe_ids in flags.items():
+                recipe[name] = recipe['id'] in recipe_ids
+        if not fieldset.expands('author'):
+            return
+        subscribed = set(user.owner_subscriptions.filter(
+            recipe_author_id__in={recipe['author']['id']
+                                  for recipe in recipes}
+        ).values_list('recipe_author_id', flat=True))
+        for recipe in recipes:
+            recipe['author']['is_subscribed'] = (
+                recipe['author']['id'] in subscribed)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Метод получения рецепта с учетом условных заголовков."""
+        return self.conditional_response(super().retrieve, request,
+                                         *args, **kwargs)
 
     def get_serializer_class(self):
         """Метод выбора сериализатора."""
-        if self.action in ('retrieve', 'list',):
+        if self.action in ('retrieve', 'list', 'feed',):
             return RecipeGetSerializer
         return RecipesSerializer
 
+    @action(detail=False, methods=('get',), url_path='feed',
+            permission_classes=(IsAuthenticated,))
+    def feed(self, request, *args, **kwargs):
+        """Метод получения рецептов авторов из подписок пользователя.
+
+        Рецепты выбираются условием author_id IN (подзапрос подписок)
+        по индексу (author, published_at) с курсорной пагинацией.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            author_id__in=Subquery(request.user.owner_subscriptions.values(
+                'recipe_author_id'))
+        )
+        serializer = self.get_serializer(
+            self.paginate_queryset(queryset), many=True)
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=('get',), url_path='get-link')
     def get_link(self, request, *args, **kwargs):
         """Метод получения ссылки на рецепт."""
@@ -169,6 +458,116 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def favorite_shoppingcart_batch_creation(self, model):
+        """Метод пакетного добавления рецептов в корзину или избранное.
+
+        Возвращает ответ со статусом каждого рецепта и множество id
+        добавленных рецептов.
+        """
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        recipes = Recipe.objects.only(
+            'id', 'name', 'image', 'image_variants', 'cooking_time'
+        ).in_bulk(recipe_ids)
+        existing = set(model.objects.filter(
+            user_id=self.request.user.id, recipe_id__in=recipes
+        ).values_list('recipe_id', flat=True))
+        records = [model(user_id=self.request.user.id, recipe_id=recipe_id)
+                   for recipe_id in recipes if recipe_id not in existing]
+        model.objects.bulk_create(records, ignore_conflicts=True)
+        # Запись, вставленную параллельным запросом после проверки,
+        # вставка пропускает: добавленными считаются только строки
+        # с отметкой времени, проставленной этой вставкой.
+        stamps = {record.recipe_id: record.created_at for record in records}
+        created = {
+            recipe_id for recipe_id, created_at in model.objects.filter(
+                user_id=self.request.user.id, recipe_id__in=stamps
+            ).values_list('recipe_id', 'created_at')
+            if stamps[recipe_id] == created_at
+        }
+        results = []
+        for recipe_id in recipe_ids:
+            if recipe_id not in recipes:
+                results.append({'id': recipe_id, 'status': 'not_found'})
+            elif recipe_id not in created:
+                results.append({'id': recipe_id, 'status': 'exists'})
+            else:
+                results.append({
+                    'id': recipe_id, 'status': 'created',
+                    'recipe': RecipeGetShortSerializer(
+                        recipes[recipe_id],
+                        context={'request': self.request}
+                    ).data
+                })
+        return Response({'results': results}), created
+
+    def favorite_shoppingcart_batch_deletion(self, model):
+        """Метод пакетного удаления рецептов из корзины или избранного.
+
+        Возвращает ответ со статусом каждого рецепта и список id
+        удаленных рецептов.
+        """
+        serializer = RecipeIdsSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        records = model.objects.filter(
+            user_id=self.request.user.id, recipe_id__in=recipe_ids)
+        deleted = set(records.values_list('recipe_id', flat=True))
+        records.delete()
+        return Response({'results': [
+            {'id': recipe_id,
+             'status': 'deleted' if recipe_id in deleted else 'not_found'}
+            for recipe_id in recipe_ids
+        ]}), deleted
+
+    @action(detail=False, methods=('post',), url_path='shopping_cart',
+            url_name='shopping-cart-batch',
+            permission_classes=(IsAuthenticated,))
+    @transaction.atomic
+    def shopping_cart_batch(self, request):
+        """Метод пакетного добавления рецептов в корзину.
+
+        Пакетная вставка не вызывает сигналы, поэтому итоги списка
+        покупок увеличиваются здесь.
+        """
+        response, created = self.favorite_shoppingcart_batch_creation(
+            model=ShoppingCart)
+        ShoppingListTotal.objects.apply_recipes((request.user.id,), created)
+        return response
+
+    @shopping_cart_batch.mapping.delete
+    @transaction.atomic
+    def delete_shopping_cart_batch(self, request):
+        """Метод пакетного удаления рецептов из корзины."""
+        response, _ = self.favorite_shoppingcart_batch_deletion(
+            model=ShoppingCart)
+        return response
+
+    @action(detail=False, methods=('post',), url_path='favorite',
+            url_name='favorite-batch',
+            permission_classes=(IsAuthenticated,))
+    @transaction.atomic
+    def favorite_batch(self, request):
+        """Метод пакетного добавления рецептов в избранное.
+
+        Пакетная вставка не вызывает сигналы, поэтому счетчики
+        избранного увеличиваются здесь.
+        """
+        response, created = self.favorite_shoppingcart_batch_creation(
+            model=Favorite)
+        Recipe.objects.filter(id__in=created).update(
+            favorites_count=F('favorites_count') + 1)
+        return response
+
+    @favorite_batch.mapping.delete
+    @transaction.atomic
+    def delete_favorite_batch(self, request):
+        """Метод пакетного удаления рецептов из избранного."""
+        response, _ = self.favorite_shoppingcart_batch_deletion(
+            model=Favorite)
+        return response
+
     @action(detail=True, methods=('post',), url_path='shopping_cart')
     def shopping_cart(self, request, id=None):
         """Метод создания записи в корзине."""
@@ -202,28 +601,66 @@ class RecipesViewSet(viewsets.ModelViewSet):
         )
 
     @staticmethod
-    def purchaselist_buffer_creation(purchase_list):
-        """Метод загрузки строк в буфер."""
-        buffer = ''
+    def purchaselist_txt_lines(purchase_list):
+        """Метод построчного вывода списка покупок в виде текста."""
         for purchase in purchase_list:
             name = purchase['ingredient__name']
             unit = purchase['ingredient__measurement_unit']
             total_amount = purchase['total_amount']
-            buffer += f'{name} ({unit}) - {total_amount},\n'
-        return buffer
+            yield f'{name} ({unit}) - {total_amount},\n'
+
+    @staticmethod
+    def purchaselist_csv_lines(purchase_list):
+        """Метод построчного вывода списка покупок в формате CSV."""
+        line = PurchaseLine()
+        writer = csv.writer(line)
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for purchase in purchase_list:
+            yield writer.writerow((
+                purchase['ingredient__name'],
+                purchase['ingredient__measurement_unit'],
+                purchase['total_amount'],
+            ))
 
-    @action(detail=False, methods=('get',), url_path='download_shopping_cart')
+    @staticmethod
+    def purchaselist_json_lines(purchase_list):
+        """Метод поэлементного вывода списка покупок в формате JSON."""
+        separator = '['
+        for purchase in purchase_list:
+            yield separator + json.dumps({
+                'name': purchase['ingredient__name'],
+                'measurement_unit': purchase['ingredient__measurement_unit'],
+                'amount': purchase['total_amount'],
+            }, ensure_ascii=False)
+            separator = ',\n'
+        yield '[]' if separator == '[' else ']'
+
+    @action(detail=False, methods=('get',), url_path='download_shopping_cart',
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer))
     def get_purchase_list(self, request, *args, **kwargs):
-        """Метод отправки файла со списком покупок."""
-        purchase_list = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart_recipe__user=request.user).order_by(
-                'ingredient__name').values(
-                'ingredient__name',
-                'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum(
-            'amount'
-        ))
-        return FileResponse(self.purchaselist_buffer_creation(
-            purchase_list=purchase_list), as_attachment=True,
-            filename='shopping_list.txt'
+        """Метод потоковой отправки файла со списком покупок.
+
+        Формат файла выбирается параметром format=txt|csv|json.
+        Под ASGI Django 3.2 перебирает потоковый ответ в цикле событий,
+        где ORM недоступна, поэтому строки списка читаются заранее.
+        """
+        purchase_list = request.user.shopping_list_totals.order_by(
+            'ingredient__name').values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount'
+        )
+        renderer = request.accepted_renderer
+        lines = getattr(self, f'purchaselist_{renderer.format}_lines')
+        rows = purchase_list.iterator()
+        if isinstance(request._request, ASGIRequest):
+            rows = list(rows)
+        response = StreamingHttpResponse(
+            lines(rows),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
+        return response
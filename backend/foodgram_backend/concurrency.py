@@ -0,0 +1,75 @@
+"""Модуль выполнения синхронного кода из асинхронных представлений."""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_executor = None
+
+_lock = threading.Lock()
+
+
+def get_executor():
+    """Функция получения ограниченного пула потоков процесса.
+
+    Размер пула ASYNC_THREADS ограничивает и число соединений с БД,
+    так как у каждого потока свое соединение.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_THREADS,
+                thread_name_prefix='async-sync'
+            )
+    return _executor
+
+
+def call_with_connections(function, *args, **kwargs):
+    """Функция вызова с закрытием устаревших соединений с БД.
+
+    Сигналы начала и конца запроса закрывают соединения только
+    в потоке запроса, поэтому потоки пула делают это сами.
+    """
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(function, *args, **kwargs):
+    """Функция выполнения синхронной функции в ограниченном пуле."""
+    return await sync_to_async(
+        call_with_connections, thread_sensitive=False,
+        executor=get_executor()
+    )(function, *args, **kwargs)
+
+
+def render_view(view, request, *args, **kwargs):
+    """Функция вызова представления с отрисовкой ответа в том же потоке."""
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def async_read_view(view):
+    """Функция получения асинхронной обертки синхронного представления.
+
+    GET, HEAD и OPTIONS выполняются в ограниченном пуле потоков,
+    остальные методы - как обычные синхронные представления под ASGI.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await run_sync(render_view, view, request,
+                                  *args, **kwargs)
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return wrapper
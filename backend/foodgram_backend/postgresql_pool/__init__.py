@@ -0,0 +1 @@
+"""Бэкенд PostgreSQL с пулом соединений в памяти процесса."""
@@ -0,0 +1,103 @@
+"""Модуль обертки соединения PostgreSQL с пулом соединений."""
+import threading
+
+import psycopg2
+import psycopg2.extras
+from django.db.backends.postgresql import base
+from psycopg2.pool import ThreadedConnectionPool
+
+_pools = {}
+
+_slots = {}
+
+_lock = threading.Lock()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Обертка соединения, берущая соединения из пула процесса.
+
+    Пул psycopg2 общий для всех потоков процесса, поэтому подходит для
+    потоковых воркеров gunicorn. Закрытие соединения в конце запроса
+    возвращает его в пул, поэтому CONN_MAX_AGE должен быть равен 0.
+    Размер пула задается ключом POOL настроек БД: MIN_SIZE и MAX_SIZE.
+    При CONN_HEALTH_CHECKS соединение из пула проверяется перед выдачей.
+    Когда все соединения заняты, поток ждет освобождения соединения
+    до TIMEOUT секунд вместо немедленной ошибки пула.
+    """
+
+    def get_pool(self, conn_params):
+        """Метод получения пула соединений этой БД."""
+        with _lock:
+            if self.alias not in _pools:
+                options = self.settings_dict.get('POOL', {})
+                _pools[self.alias] = ThreadedConnectionPool(
+                    options.get('MIN_SIZE', 1), options.get('MAX_SIZE', 10),
+                    **conn_params
+                )
+                _slots[self.alias] = threading.BoundedSemaphore(
+                    _pools[self.alias].maxconn)
+            return _pools[self.alias]
+
+    def get_new_connection(self, conn_params):
+        """Метод получения соединения из пула.
+
+        Повторяет подготовку соединения из бэкенда postgresql.
+        """
+        pool = self.get_pool(conn_params)
+        timeout = self.settings_dict.get('POOL', {}).get('TIMEOUT', 10)
+        if not _slots[self.alias].acquire(timeout=timeout):
+            raise psycopg2.OperationalError(
+                f'Нет свободных соединений в пуле за {timeout} с.')
+        try:
+            connection = self.get_usable_connection(pool)
+        except BaseException:
+            _slots[self.alias].release()
+            raise
+        try:
+            options = self.settings_dict['OPTIONS']
+            self.isolation_level = options.get(
+                'isolation_level', connection.isolation_level)
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+            psycopg2.extras.register_default_jsonb(conn_or_curs=connection,
+                                                   loads=lambda x: x)
+        except BaseException:
+            pool.putconn(connection, close=True)
+            _slots[self.alias].release()
+            raise
+        return connection
+
+    def get_usable_connection(self, pool):
+        """Метод получения из пула работающего соединения.
+
+        Соединения, не прошедшие проверку, закрываются. Если не
+        прошло ни одно, вызывается ошибка соединения с БД.
+        """
+        for _ in range(pool.maxconn + 1):
+            connection = pool.getconn()
+            if (not self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    or self.ping(connection)):
+                return connection
+            pool.putconn(connection, close=True)
+        raise psycopg2.OperationalError(
+            'Не удалось получить работающее соединение из пула.')
+
+    @staticmethod
+    def ping(connection):
+        """Метод проверки, что соединение из пула еще работает."""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self):
+        """Метод возврата соединения в пул вместо закрытия."""
+        if self.connection is not None:
+            try:
+                with self.wrap_database_errors:
+                    _pools[self.alias].putconn(self.connection)
+            finally:
+                _slots[self.alias].release()
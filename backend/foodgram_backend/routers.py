@@ -0,0 +1,82 @@
+"""Модуль маршрутизации запросов к базам данных."""
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+REPLICA = 'replica'
+
+PRIMARY = 'default'
+
+PIN_COOKIE = 'db_primary_pin'
+
+replica_state = ContextVar('replica_state', default=None)
+
+
+def replica_configured():
+    """Функция проверки, что реплика БД настроена."""
+    return REPLICA in connections.databases
+
+
+def pin_user(user_id):
+    """Функция закрепления чтения пользователя за основной БД.
+
+    Закрепление действует REPLICA_PIN_SECONDS - время, за которое
+    реплика должна получить записанные изменения.
+    """
+    cache.set(f'replica-pin:{user_id}', True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_user_pinned(user_id):
+    """Функция проверки закрепления пользователя за основной БД."""
+    return cache.get(f'replica-pin:{user_id}', False)
+
+
+class ReplicaState:
+    """Класс состояния маршрутизации одного HTTP-запроса.
+
+    allowed - представление разрешило читать с реплики,
+    pinned - запрос или клиент недавно писал и читает с основной БД.
+    """
+
+    def __init__(self, pinned=False):
+        self.allowed = False
+        self.pinned = pinned
+        self.written = False
+
+    @property
+    def use_replica(self):
+        """Признак чтения с реплики."""
+        return (self.allowed and not self.pinned
+                and not connections[PRIMARY].in_atomic_block)
+
+
+class ReplicaRouter:
+    """Маршрутизатор чтения с реплики для безопасных запросов.
+
+    С реплики читают только представления, разрешившие это в
+    состоянии запроса. Любая запись отправляется в основную БД и
+    закрепляет за ней чтение до конца запроса.
+    """
+
+    def db_for_read(self, model, **hints):
+        """Метод выбора БД для чтения."""
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        state = replica_state.get()
+        if state is not None and state.use_replica:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        """Метод выбора БД для записи."""
+        state = replica_state.get()
+        if state is not None:
+            state.pinned = state.written = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Метод проверки связи объектов: реплика - копия основной БД."""
+        return True
@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'django_filters',
@@ -35,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryTimingMiddleware',
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -74,14 +77,62 @@ if os.getenv('DATABASE_VAR', 'prodsql') == 'debugsql':
         }
     }
 else:
+    DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': ('foodgram_backend.postgresql_pool' if DB_POOL
+                       else 'django.db.backends.postgresql'),
             'NAME': os.getenv('POSTGRES_DB', 'django'),
             'USER': os.getenv('POSTGRES_USER', 'django'),
             'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
             'HOST': os.getenv('DB_HOST', ''),
-            'PORT': os.getenv('DB_PORT', 5432)
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': (0 if DB_POOL
+                             else int(os.getenv('DB_CONN_MAX_AGE', 60))),
+            'CONN_HEALTH_CHECKS': (
+                os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'),
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+            'POOL': {
+                'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+                'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+                'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            },
+        }
+    }
+
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST', '')
+
+DB_REPLICA_NAME = os.getenv('DB_REPLICA_NAME', '')
+
+if DB_REPLICA_HOST or DB_REPLICA_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DB_REPLICA_HOST or DATABASES['default'].get('HOST', ''),
+        'PORT': os.getenv('DB_REPLICA_PORT',
+                          DATABASES['default'].get('PORT', '')),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['foodgram_backend.routers.ReplicaRouter']
+
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+
+SHARED_CACHE = os.getenv('CACHE_BACKEND', 'locmem') == 'file'
+
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', BASE_DIR / 'cache'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
         }
     }
 
@@ -143,7 +194,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachingTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS':
@@ -151,6 +202,61 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+HTTP_CACHE_MAX_AGE = int(os.getenv('HTTP_CACHE_MAX_AGE', 0))
+
+RECIPES_CACHE_ENABLED = os.getenv(
+    'RECIPES_CACHE_ENABLED', str(SHARED_CACHE)) == 'True'
+
+RECIPES_CACHE_ALIAS = 'default'
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+
+SHORT_LINK_NEGATIVE_TTL = int(os.getenv('SHORT_LINK_NEGATIVE_TTL', 60))
+
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+RECIPES_CURSOR_PAGINATION = (
+    os.getenv('RECIPES_CURSOR_PAGINATION', 'False') == 'True'
+)
+
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+
+SERVER_PROFILE = os.getenv('SERVER_PROFILE', 'wsgi')
+
+ASYNC_VIEWS = os.getenv(
+    'ASYNC_VIEWS', str(SERVER_PROFILE == 'asgi')) == 'True'
+
+ASYNC_THREADS = int(os.getenv('ASYNC_THREADS', 20))
+
+QUERY_TIMING_ENABLED = os.getenv('QUERY_TIMING_ENABLED', 'False') == 'True'
+
+QUERY_BUDGET = int(os.getenv('QUERY_BUDGET', 20))
+
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', 3))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 CORS_ORIGIN_ALLOW_ALL = True
 
 CORS_URLS_REGEX = r'^/api/.*$'
@@ -4,12 +4,15 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
-from recipes.views import recipe_shortlinked_retreave
+from recipes.views import (recipe_shortlinked_retreave,
+                           recipe_shortlinked_retreave_async)
 
 urlpatterns = [
     path('api/', include('api.urls')),
     path('admin/', admin.site.urls),
-    path(r's/<slug:slug>', recipe_shortlinked_retreave,
+    path(r's/<slug:slug>',
+         (recipe_shortlinked_retreave_async if settings.ASYNC_VIEWS
+          else recipe_shortlinked_retreave),
          name='recipe_shortlinked_retreave'),
 ]
 
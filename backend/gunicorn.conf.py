@@ -0,0 +1,50 @@
+"""Модуль настроек gunicorn, задаваемых переменными окружения.
+
+Профиль SERVER_PROFILE=wsgi запускает синхронные или потоковые
+воркеры, профиль asgi - воркеры uvicorn, в каждом из которых один
+процесс обслуживает много одновременных соединений.
+
+Кеш locmem у каждого процесса свой, поэтому без общего кеша
+(CACHE_BACKEND=file) по умолчанию запускается один процесс, а
+параллельность дают потоки: иначе поколения кеша ленты, сброс кеша
+токенов и закрепление чтения за основной БД действовали бы только
+в процессе, обработавшем запрос.
+"""
+import multiprocessing
+import os
+
+ASGI = os.getenv('SERVER_PROFILE', 'wsgi') == 'asgi'
+
+SHARED_CACHE = os.getenv('CACHE_BACKEND', 'locmem') == 'file'
+
+wsgi_app = ('foodgram_backend.asgi:application' if ASGI
+            else 'foodgram_backend.wsgi:application')
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    1 if not SHARED_CACHE
+    else multiprocessing.cpu_count() + 1 if ASGI
+    else multiprocessing.cpu_count() * 2 + 1
+))
+
+threads = int(os.getenv(
+    'GUNICORN_THREADS',
+    multiprocessing.cpu_count() * 2 + 1 if not SHARED_CACHE and not ASGI
+    else 1
+))
+
+worker_class = os.getenv(
+    'GUNICORN_WORKER_CLASS',
+    'uvicorn.workers.UvicornWorker' if ASGI
+    else 'gthread' if threads > 1 else 'sync'
+)
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+
+max_requests_jitter = max_requests // 10
@@ -34,15 +34,16 @@ class UsersAdmin(UserAdmin):
         ('Extra Fields', {'fields': ('avatar',)}),
     )
 
-    @admin.display(description='к-во рецептов')
+    @admin.display(description='к-во рецептов', ordering='recipes_count')
     def get_count_recipes(self, object):
         """Метод получения количества рецептов."""
-        return object.recipes.all().count()
+        return object.recipes_count
 
-    @admin.display(description='к-во подписчиков')
+    @admin.display(description='к-во подписчиков',
+                   ordering='subscribers_count')
     def get_count_subscribers(self, object):
         """Метод получения количества подписчиков."""
-        return object.owner_subscriptions.all().count()
+        return object.subscribers_count
 
 
 @admin.register(Tag)
@@ -88,10 +89,10 @@ class RecipeAdmin(admin.ModelAdmin):
         RecipeIngredientInline,
     )
 
-    @admin.display(description='в избранном')
+    @admin.display(description='в избранном', ordering='favorites_count')
     def get_count_is_favorited(self, object):
         """Метод получения числа добавлений в избранное."""
-        return object.favorite_recipe.all().count()
+        return object.favorites_count
 
     @admin.display(description='теги')
     def get_tags(self, object):
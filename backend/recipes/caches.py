@@ -0,0 +1,68 @@
+"""Модуль кешей приложения, хранящихся в памяти процесса."""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .models import Recipe
+
+
+class ShortLinkCache:
+    """Ограниченный LRU кеш соответствия коротких ссылок рецептам.
+
+    Короткая ссылка рецепта не меняется, поэтому найденные ссылки
+    хранятся до вытеснения или удаления рецепта. Неизвестные ссылки
+    запоминаются на SHORT_LINK_NEGATIVE_TTL секунд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._recipes = OrderedDict()
+
+    def get_recipe_id(self, short_link):
+        """Метод получения id рецепта по короткой ссылке.
+
+        Возвращает None, если рецепта с такой ссылкой нет.
+        """
+        with self._lock:
+            if short_link in self._recipes:
+                recipe_id, expires_at = self._recipes[short_link]
+                if expires_at is None or expires_at > time.monotonic():
+                    self._recipes.move_to_end(short_link)
+                    return recipe_id
+        recipe_id = Recipe.objects.filter(short_link=short_link).values_list(
+            'id', flat=True).first()
+        expires_at = None
+        if recipe_id is None:
+            expires_at = time.monotonic() + settings.SHORT_LINK_NEGATIVE_TTL
+        with self._lock:
+            self._recipes[short_link] = (recipe_id, expires_at)
+            self._recipes.move_to_end(short_link)
+            while len(self._recipes) > settings.SHORT_LINK_CACHE_SIZE:
+                self._recipes.popitem(last=False)
+        return recipe_id
+
+    def peek(self, short_link):
+        """Метод получения id рецепта только из кеша, без запроса к БД.
+
+        Возвращает None, если найденной ссылки в кеше нет.
+        """
+        with self._lock:
+            recipe_id = self._recipes.get(short_link, (None, None))[0]
+            if recipe_id is not None:
+                self._recipes.move_to_end(short_link)
+            return recipe_id
+
+    def invalidate(self, short_link):
+        """Метод удаления короткой ссылки из кеша."""
+        with self._lock:
+            self._recipes.pop(short_link, None)
+
+    def clear(self):
+        """Метод очистки кеша."""
+        with self._lock:
+            self._recipes.clear()
+
+
+short_link_cache = ShortLinkCache()
@@ -14,3 +14,32 @@ RECIPE_NAME_MAX_LENGTH = 256
 MIN_VALIDATOR_VALUE = 1
 
 MAX_VALIDATOR_VALUE = 32767
+
+SEARCH_CONFIG = 'russian'
+
+SHORT_LINK_LENGTH = 5
+
+SHORT_LINK_ATTEMPTS = 5
+
+RECIPE_IMAGE_VARIANTS = {
+    'card': (480, 480),
+    'detail': (1200, 1200),
+}
+
+AVATAR_IMAGE_VARIANTS = {
+    'avatar': (160, 160),
+}
+
+IMAGE_VARIANT_FORMATS = ('webp', 'jpeg')
+
+IMAGE_VARIANT_QUALITY = 80
+
+IMAGE_ORIGINAL_QUALITY = 95
+
+IMAGE_METADATA_KEYS = ('exif', 'xmp', 'XML:com.adobe.xmp', 'comment')
+
+BATCH_MAX_SIZE = 100
+
+IMPORT_BATCH_SIZE = 1000
+
+EXPORT_BATCH_SIZE = 500
@@ -0,0 +1,180 @@
+"""Модуль обработки фото рецептов и аватаров."""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .constants import (AVATAR_IMAGE_VARIANTS, IMAGE_METADATA_KEYS,
+                        IMAGE_ORIGINAL_QUALITY, IMAGE_VARIANT_FORMATS,
+                        IMAGE_VARIANT_QUALITY, RECIPE_IMAGE_VARIANTS)
+from .models import FoodgramUser, Recipe
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    """Функция получения пула фоновой обработки изображений."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='images'
+        )
+    return _executor
+
+
+def encode_image(image, image_format, quality=IMAGE_VARIANT_QUALITY,
+                 **options):
+    """Функция кодирования изображения без метаданных."""
+    buffer = io.BytesIO()
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.save(buffer, format=image_format, quality=quality, optimize=True,
+               **options)
+    return buffer.getvalue()
+
+
+def strip_image_metadata(field_file):
+    """Функция создания копии оригинала без метаданных EXIF и XMP.
+
+    Оригинал с метаданными перекодируется в том же формате с учетом
+    поворота из EXIF, цветовой профиль сохраняется. Копия пишется под
+    новым именем, оригинал не меняется. Возвращает имя копии или None,
+    если метаданных нет.
+    """
+    with field_file.open('rb') as original:
+        image = Image.open(original)
+        image_format = 'jpeg' if image.format == 'MPO' else (
+            image.format.lower())
+        if (not image.getexif()
+                and not image.info.keys() & set(IMAGE_METADATA_KEYS)):
+            return None
+        icc_profile = image.info.get('icc_profile')
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    image.info = {}
+    content = encode_image(
+        image, image_format, quality=IMAGE_ORIGINAL_QUALITY,
+        **({'icc_profile': icc_profile} if icc_profile else {}))
+    return field_file.storage.save(field_file.name, ContentFile(content))
+
+
+def delete_image_variants(field_file, variants):
+    """Функция удаления файлов вариантов изображения."""
+    for formats in variants.values():
+        for name in formats.values():
+            field_file.storage.delete(name)
+
+
+def create_image_variants(field_file, sizes):
+    """Функция создания уменьшенных вариантов изображения.
+
+    Возвращает словарь {вариант: {формат: имя файла}}. Варианты
+    сохраняются без метаданных рядом с оригиналом в каталоге variants.
+    """
+    with field_file.open('rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    directory, file_name = os.path.split(field_file.name)
+    stem = os.path.splitext(file_name)[0]
+    variants = {}
+    for variant, size in sizes.items():
+        thumbnail = image.copy()
+        thumbnail.thumbnail(size, Image.LANCZOS)
+        variants[variant] = {
+            image_format: field_file.storage.save(
+                os.path.join(directory, 'variants',
+                             f'{stem}_{variant}.{image_format}'),
+                ContentFile(encode_image(thumbnail, image_format))
+            )
+            for image_format in IMAGE_VARIANT_FORMATS
+        }
+    return variants
+
+
+def process_image(model, object_id, field, sizes, update_fields=()):
+    """Функция обработки изображения в поле объекта.
+
+    Копия без метаданных и варианты создаются под новыми именами и
+    записываются, только если изображение объекта не заменили за
+    время обработки. Прежние файлы удаляются после записи, а при
+    замене изображения удаляются созданные файлы.
+    """
+    instance = model.objects.filter(id=object_id).first()
+    if instance is None or not getattr(instance, field):
+        return
+    field_file = getattr(instance, field)
+    variants_field = f'{field}_variants'
+    original = field_file.name
+    stripped = strip_image_metadata(field_file)
+    if stripped:
+        field_file.name = stripped
+    variants = create_image_variants(field_file, sizes)
+    with transaction.atomic():
+        current = model.objects.select_for_update().filter(
+            id=object_id, **{field: original}).first()
+        if current is not None:
+            previous_variants = getattr(current, variants_field)
+            setattr(current, field, field_file.name)
+            setattr(current, variants_field, variants)
+            current.save(
+                update_fields=(field, variants_field, *update_fields))
+    if current is None:
+        delete_image_variants(field_file, variants)
+        if stripped:
+            field_file.storage.delete(stripped)
+        return
+    delete_image_variants(field_file, previous_variants)
+    if stripped:
+        field_file.storage.delete(original)
+
+
+def process_recipe_image(recipe_id):
+    """Функция обработки фото рецепта."""
+    process_image(Recipe, recipe_id, 'image', RECIPE_IMAGE_VARIANTS,
+                  update_fields=('updated_at',))
+
+
+def process_avatar(user_id):
+    """Функция обработки аватара пользователя."""
+    process_image(FoodgramUser, user_id, 'avatar', AVATAR_IMAGE_VARIANTS)
+
+
+def run_task(task, object_id):
+    """Функция выполнения задачи обработки в потоке пула.
+
+    Возвращает True, если обработка завершилась без ошибки.
+    """
+    try:
+        task(object_id)
+    except Exception:
+        logger.exception('Ошибка обработки изображения %s.', object_id)
+        return False
+    finally:
+        close_old_connections()
+    return True
+
+
+def schedule(task, object_id):
+    """Функция постановки обработки изображения в очередь.
+
+    Обработка начинается после фиксации транзакции. Если число
+    потоков IMAGE_PROCESSING_WORKERS равно нулю, изображение
+    обрабатывается сразу в текущем потоке.
+    """
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(lambda: task(object_id))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_task, task, object_id))
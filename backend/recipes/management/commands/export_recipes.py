@@ -0,0 +1,116 @@
+"""Модуль пользовательского скрипта выгрузки рецептов."""
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from recipes.constants import EXPORT_BATCH_SIZE
+from recipes.models import FoodgramUser, IngredientInRecipe, Recipe, Tag
+from recipes.transfer import get_pool, open_stream, pool_map, read_image_data
+
+
+class Command(BaseCommand):
+    """Команда для выгрузки рецептов в NDJSON."""
+
+    help = ('Выгружает рецепты с тегами, авторами, ингредиентами и фото '
+            'в NDJSON: одна запись в строке.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Путь к файлу (.gz - со сжатием) или - для stdout.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=EXPORT_BATCH_SIZE,
+            help='Число рецептов, загружаемых из БД за один запрос.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов чтения фото (0 - в текущем процессе).'
+        )
+        parser.add_argument(
+            '--skip-images', action='store_true',
+            help='Выгружать только имена файлов фото без содержимого.'
+        )
+
+    def handle(self, *args, **options):
+        path, batch_size = options['path'], options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        exported = 0
+        try:
+            with open_stream(path, 'wt', self.stdout) as file, \
+                    get_pool(options['workers']) as pool:
+                for record in self.get_records(
+                        batch_size, pool, options['skip_images']):
+                    file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    exported += record['type'] == 'recipe'
+        except OSError as error:
+            raise CommandError(f'Ошибка записи данных: {error}.')
+        output = self.stderr if path == '-' else self.stdout
+        output.write(self.style.SUCCESS(
+            f'Выгрузка завершена: рецептов {exported}.'))
+
+    def get_records(self, batch_size, pool, skip_images):
+        """Метод получения записей тегов, авторов и рецептов."""
+        for tag in Tag.objects.order_by('id').values(
+                'name', 'slug').iterator():
+            yield {'type': 'tag', **tag}
+        for user in FoodgramUser.objects.filter(
+            id__in=Recipe.objects.values('author_id')
+        ).order_by('id').values(
+                'username', 'email', 'first_name', 'last_name').iterator():
+            yield {'type': 'user', **user}
+        for recipes in self.get_recipe_batches(batch_size):
+            images = [None] * len(recipes)
+            if not skip_images:
+                images = pool_map(pool, read_image_data,
+                                  [recipe.image.name for recipe in recipes])
+            for recipe, image_data in zip(recipes, images):
+                yield self.get_recipe_record(recipe, image_data)
+
+    @staticmethod
+    def get_recipe_batches(batch_size):
+        """Метод постраничной загрузки рецептов со связями.
+
+        Страницы выбираются по возрастанию id, поэтому память
+        не растет с числом рецептов.
+        """
+        recipes = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('ingredientinrecipe',
+                     queryset=IngredientInRecipe.objects.select_related(
+                         'ingredient'))
+        ).order_by('id')
+        last_id = 0
+        while True:
+            batch = list(recipes.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    @staticmethod
+    def get_recipe_record(recipe, image_data):
+        """Метод получения записи рецепта."""
+        record = {
+            'type': 'recipe',
+            'short_link': recipe.short_link,
+            'author': recipe.author.username,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'published_at': recipe.published_at.isoformat(),
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {'name': row.ingredient.name,
+                 'measurement_unit': row.ingredient.measurement_unit,
+                 'amount': row.amount}
+                for row in recipe.ingredientinrecipe.all()
+            ],
+            'image': recipe.image.name,
+        }
+        if image_data is not None:
+            record['image_data'] = image_data
+        return record
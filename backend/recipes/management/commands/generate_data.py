@@ -0,0 +1,225 @@
+"""Модуль пользовательского скрипта генерации тестовых данных."""
+import io
+import random
+import secrets
+import string
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from recipes.constants import (IMPORT_BATCH_SIZE, SHORT_LINK_ATTEMPTS,
+                               SHORT_LINK_LENGTH)
+from recipes.models import (ContentVersion, Favorite, FoodgramUser,
+                            Ingredient, IngredientInRecipe, Recipe,
+                            ShoppingCart, Subscription, Tag)
+from recipes.signals import bulk_changed
+
+IMAGE_NAME = 'recipes/images/generated.png'
+
+TAGS = (('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+        ('Десерт', 'dessert'), ('Выпечка', 'bakery'))
+
+DISHES = ('Салат', 'Суп', 'Запеканка', 'Пирог', 'Рагу', 'Омлет', 'Каша',
+          'Паста', 'Плов', 'Блины')
+
+WORDS = ('нарезать', 'смешать', 'добавить', 'довести', 'до', 'кипения',
+         'посолить', 'обжарить', 'на', 'среднем', 'огне', 'минут',
+         'подавать', 'горячим', 'с', 'зеленью', 'и', 'запекать', 'в',
+         'духовке')
+
+PUBLISHED_DAYS = 365
+
+
+def batches(items, size):
+    """Функция разбиения последовательности на пакеты."""
+    items = iter(items)
+    return iter(lambda: list(islice(items, size)), [])
+
+
+class Command(BaseCommand):
+    """Команда для генерации пользователей, рецептов и связей.
+
+    Популярность авторов и рецептов распределена по закону Ципфа:
+    немногие получают большую часть подписок, избранного и корзин.
+    """
+
+    help = ('Генерирует пользователей, рецепты, ингредиенты рецептов, '
+            'избранное, корзины и подписки в заданном объеме.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100,
+                            help='Число пользователей.')
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Число рецептов.')
+        parser.add_argument('--ingredients', type=int, default=6,
+                            help='Среднее число ингредиентов в рецепте.')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число рецептов в избранном.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE,
+                            help='Число объектов в одном запросе.')
+        parser.add_argument('--seed', type=int,
+                            help='Начальное значение генератора.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        with transaction.atomic():
+            tag_ids = self.get_tag_ids()
+            ingredient_ids = self.get_ingredient_ids()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], user_ids, tag_ids, ingredient_ids,
+                options['ingredients'])
+            self.create_links(Subscription, 'user_id', 'recipe_author_id',
+                              user_ids, user_ids, options['subscriptions'],
+                              exclude_self=True)
+            self.create_links(Favorite, 'user_id', 'recipe_id', user_ids,
+                              recipe_ids, options['favorites'])
+            self.create_links(ShoppingCart, 'user_id', 'recipe_id',
+                              user_ids, recipe_ids, options['cart'])
+            call_command('reconcile_counters', stdout=io.StringIO())
+            call_command('rebuild_shopping_lists', stdout=io.StringIO())
+            ContentVersion.objects.bump(ContentVersion.USERS)
+            bulk_changed.send(sender=self.__class__,
+                              models=(Recipe, Tag, Ingredient))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей {len(user_ids)}, '
+            f'рецептов {len(recipe_ids)}.'))
+
+    def get_tag_ids(self):
+        """Метод получения тегов, создает их при пустом справочнике."""
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(Tag(name=name, slug=slug)
+                                    for name, slug in TAGS)
+            ContentVersion.objects.bump(ContentVersion.TAGS)
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def get_ingredient_ids(self):
+        """Метод получения ингредиентов, создает их при пустом справочнике."""
+        if not Ingredient.objects.exists():
+            Ingredient.objects.bulk_create(
+                Ingredient(name=f'ингредиент {number}', measurement_unit='г')
+                for number in range(1, 201)
+            )
+            ContentVersion.objects.bump(ContentVersion.INGREDIENTS)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        """Метод создания пользователей без пароля."""
+        prefix = f'gen_{secrets.token_hex(4)}_'
+        password = make_password(None)
+        for batch in batches(range(count), self.batch_size):
+            FoodgramUser.objects.bulk_create(
+                FoodgramUser(
+                    username=f'{prefix}{number}',
+                    email=f'{prefix}{number}@example.com',
+                    first_name=f'Имя{number}', last_name=f'Фамилия{number}',
+                    password=password,
+                ) for number in batch
+            )
+        return list(FoodgramUser.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+
+    def get_image(self):
+        """Метод получения общего фото сгенерированных рецептов."""
+        if not default_storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new('RGB', (64, 64), 'orange').save(buffer, format='PNG')
+            return default_storage.save(IMAGE_NAME,
+                                        ContentFile(buffer.getvalue()))
+        return IMAGE_NAME
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids,
+                       ingredients_per_recipe):
+        """Метод создания рецептов с тегами и ингредиентами."""
+        image = self.get_image()
+        authors = self.zipf_weights(len(user_ids))
+        now = timezone.now()
+        recipe_ids = []
+        for batch in batches(range(count), self.batch_size):
+            recipes = [
+                Recipe(
+                    author_id=self.random.choices(user_ids, authors)[0],
+                    name=(f'{self.random.choice(DISHES)} '
+                          f'№{self.random.randint(1, 10000)}'),
+                    text=' '.join(self.random.choices(WORDS, k=40)),
+                    cooking_time=self.random.randint(5, 180),
+                    image=image,
+                    short_link=''.join(
+                        secrets.choice(string.ascii_letters + string.digits)
+                        for _ in range(SHORT_LINK_LENGTH
+                                       + SHORT_LINK_ATTEMPTS)),
+                ) for _ in batch
+            ]
+            Recipe.objects.bulk_create_recipes(recipes, {
+                recipe.short_link: now - timedelta(
+                    seconds=self.random.randint(
+                        0, PUBLISHED_DAYS * 24 * 60 * 60))
+                for recipe in recipes
+            })
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+                for recipe in recipes
+                for tag_id in self.random.sample(
+                    tag_ids, self.random.randint(1, min(3, len(tag_ids))))
+            )
+            IngredientInRecipe.objects.bulk_create(
+                IngredientInRecipe(recipe_id=recipe.id,
+                                   ingredient_id=ingredient_id,
+                                   amount=self.random.randint(1, 500))
+                for recipe in recipes
+                for ingredient_id in self.random.sample(
+                    ingredient_ids, self.sample_size(
+                        ingredients_per_recipe, len(ingredient_ids), 1))
+            )
+            recipe_ids.extend(recipe.id for recipe in recipes)
+        return recipe_ids
+
+    def create_links(self, model, owner_field, target_field, owner_ids,
+                     target_ids, average, exclude_self=False):
+        """Метод создания связей пользователей с объектами.
+
+        Объекты выбираются с весами по закону Ципфа.
+        """
+        if not target_ids or not average:
+            return
+        weights = self.zipf_weights(len(target_ids))
+        for batch in batches(owner_ids, self.batch_size):
+            links = set()
+            for owner_id in batch:
+                size = self.sample_size(average, len(target_ids))
+                links.update(
+                    (owner_id, target_id) for target_id in
+                    self.random.choices(target_ids, weights, k=size)
+                    if not exclude_self or owner_id != target_id
+                )
+            model.objects.bulk_create(
+                (model(**{owner_field: owner_id, target_field: target_id})
+                 for owner_id, target_id in links),
+                ignore_conflicts=True
+            )
+
+    def sample_size(self, average, limit, minimum=0):
+        """Метод получения случайного размера выборки около среднего."""
+        return max(minimum, min(limit, round(
+            self.random.expovariate(1 / average)) if average else 0))
+
+    @staticmethod
+    def zipf_weights(count):
+        """Метод получения весов распределения Ципфа."""
+        return [1 / rank for rank in range(1, count + 1)]
@@ -1,48 +1,192 @@
-"""Модуль пользовательского скрипта загрузки файла."""
+"""Модуль пользовательского скрипта загрузки ингредиентов."""
 import csv
-import os
+import io
+import json
+import sys
+from contextlib import nullcontext
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from recipes.models import Ingredient
+from recipes.constants import (IMPORT_BATCH_SIZE,
+                               INGREDIENT_MEASURMENT_UNIT_MAX_LENGTH,
+                               INGREDIENT_NAME_MAX_LENGTH)
+from recipes.models import ContentVersion, Ingredient
+from recipes.signals import bulk_changed
 
+DEFAULT_PATH = settings.BASE_DIR / 'data' / 'ingredients.csv'
+
+FIELDNAMES = ['name', 'measurement_unit']
+
+JSON_CHUNK_SIZE = 64 * 1024
+
+STAGING_TABLE = 'recipes_ingredient_import'
+
+
+def read_csv(file):
+    """Функция чтения пар название-единица из CSV без заголовка."""
+    for row in csv.reader(file):
+        if row[:2] != FIELDNAMES:
+            yield (row + ['', ''])[:2]
 
-class Command(BaseCommand):
-    """Команда для импорта данных из CSV файла по указанной
-    директории в модель."""
 
-    def handle(self, *args, **kwargs):
+def read_json(file):
+    """Функция потокового чтения массива объектов или JSON Lines."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n[],')
         try:
-            directory = os.path.join(
-                os.path.dirname(__file__), '../../../data')
-            os.chdir(directory)
-
-            self.import_data('ingredients.csv', self.import_ingredients)
-
-            self.stdout.write(
-                self.style.SUCCESS('Импорт данных из CSV файла завершен.'))
-
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'Произошла ошибка при импорте данных: {e}'))
-
-    def import_data(self, file_name, import_function):
-        """Метод для импорта данных из CSV файла."""
-        with open(
-                file_name, mode='r', encoding='utf-8', newline='') as csvfile:
-            fieldnames = ['name', 'measurement_unit']
-            csv_reader = csv.DictReader(csvfile, fieldnames=fieldnames)
-            ingredients_list = []
-            for row in csv_reader:
-                new_ingredient = Ingredient(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit']
-                )
-                ingredients_list.append(new_ingredient)
-            import_function(ingredients_list)
-
-    def import_ingredients(self, ingredients_list):
-        """Импорт данных в модель Ingredient."""
-        Ingredient.objects.bulk_create(
-            ingredients_list, ignore_conflicts=True
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as error:
+            if eof:
+                if buffer:
+                    raise CommandError(f'Некорректный JSON: {error}.')
+                return
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        if not isinstance(item, dict):
+            item = {}
+        yield item.get('name'), item.get('measurement_unit')
+
+
+def clean(name, measurement_unit):
+    """Функция проверки строки, возвращает None для некорректных."""
+    if not isinstance(name, str) or not isinstance(measurement_unit, str):
+        return None
+    name, measurement_unit = name.strip(), measurement_unit.strip()
+    if (not name or not measurement_unit
+            or len(name) > INGREDIENT_NAME_MAX_LENGTH
+            or len(measurement_unit) > INGREDIENT_MEASURMENT_UNIT_MAX_LENGTH):
+        return None
+    return name, measurement_unit
+
+
+class Command(BaseCommand):
+    """Команда для импорта и обновления ингредиентов из CSV или JSON."""
+
+    help = ('Загружает ингредиенты из CSV или JSON файла либо stdin, '
+            'обновляя единицы измерения уже существующих.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=str(DEFAULT_PATH),
+            help='Путь к файлу или - для чтения из stdin.'
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'json'), dest='data_format',
+            help='Формат данных (по умолчанию по расширению файла, '
+                 'для stdin - csv).'
         )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Число строк, записываемых за одну транзакцию.'
+        )
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY при работе с PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        path, batch_size = options['path'], options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        data_format = options['data_format'] or (
+            'json' if path.endswith(('.json', '.jsonl')) else 'csv')
+        read = read_json if data_format == 'json' else read_csv
+        upsert = (self.upsert_copy if connection.vendor == 'postgresql'
+                  and not options['no_copy'] else self.upsert_orm)
+        inserted = updated = skipped = 0
+        try:
+            with self.open(path) as file:
+                rows = read(file)
+                for batch in iter(lambda: list(islice(rows, batch_size)), []):
+                    ingredients = {}
+                    for row in filter(None, (clean(*row) for row in batch)):
+                        ingredients[row[0]] = row[1]
+                    with transaction.atomic():
+                        batch_inserted, batch_updated = upsert(ingredients)
+                    inserted += batch_inserted
+                    updated += batch_updated
+                    skipped += len(batch) - batch_inserted - batch_updated
+        except (OSError, UnicodeDecodeError, csv.Error) as error:
+            raise CommandError(f'Ошибка чтения данных: {error}.')
+        finally:
+            if inserted or updated:
+                ContentVersion.objects.bump(ContentVersion.INGREDIENTS)
+                bulk_changed.send(sender=self.__class__, models=(Ingredient,))
+        self.stdout.write(self.style.SUCCESS(
+            f'Импорт ингредиентов завершен: добавлено {inserted}, '
+            f'обновлено {updated}, пропущено {skipped}.'))
+
+    @staticmethod
+    def open(path):
+        """Метод открытия файла или stdin для чтения."""
+        if path == '-':
+            return nullcontext(sys.stdin)
+        return open(path, encoding='utf-8', newline='')
+
+    @staticmethod
+    def upsert_orm(ingredients):
+        """Метод записи пакета ингредиентов средствами ORM."""
+        existing = list(Ingredient.objects.filter(
+            name__in=ingredients
+        ).values_list('name', 'id', 'measurement_unit'))
+        changed = [
+            Ingredient(id=pk, measurement_unit=ingredients[name])
+            for name, pk, measurement_unit in existing
+            if ingredients[name] != measurement_unit
+        ]
+        known = {name for name, _, _ in existing}
+        new = [
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in ingredients.items()
+            if name not in known
+        ]
+        Ingredient.objects.bulk_create(new, ignore_conflicts=True)
+        Ingredient.objects.bulk_update(changed, ['measurement_unit'])
+        return len(new), len(changed)
+
+    @staticmethod
+    def upsert_copy(ingredients):
+        """Метод записи пакета ингредиентов через COPY в PostgreSQL.
+
+        Пакет копируется во временную таблицу, откуда одним запросом
+        добавляются новые ингредиенты и обновляются единицы измерения.
+        """
+        if not ingredients:
+            return 0, 0
+        data = io.StringIO()
+        csv.writer(data).writerows(ingredients.items())
+        data.seek(0)
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ('
+                f'name varchar({INGREDIENT_NAME_MAX_LENGTH}), '
+                f'measurement_unit '
+                f'varchar({INGREDIENT_MEASURMENT_UNIT_MAX_LENGTH})'
+                f') ON COMMIT DELETE ROWS'
+            )
+            cursor.copy_expert(
+                f'COPY {STAGING_TABLE} (name, measurement_unit) '
+                f'FROM STDIN WITH (FORMAT csv)', data
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM {STAGING_TABLE} '
+                f'ON CONFLICT (name) DO UPDATE '
+                f'SET measurement_unit = EXCLUDED.measurement_unit '
+                f'WHERE {table}.measurement_unit '
+                f'IS DISTINCT FROM EXCLUDED.measurement_unit '
+                f'RETURNING xmax = 0'
+            )
+            results = [created for created, in cursor.fetchall()]
+        inserted = sum(results)
+        return inserted, len(results) - inserted
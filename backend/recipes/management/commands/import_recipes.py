@@ -0,0 +1,262 @@
+"""Модуль пользовательского скрипта загрузки рецептов."""
+import json
+import os
+import secrets
+import string
+from collections import Counter
+from itertools import groupby, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils.dateparse import parse_datetime
+
+from recipes.constants import (IMPORT_BATCH_SIZE, MAX_VALIDATOR_VALUE,
+                               MIN_VALIDATOR_VALUE, SHORT_LINK_ATTEMPTS,
+                               SHORT_LINK_LENGTH)
+from recipes.models import (ContentVersion, FoodgramUser, Ingredient,
+                            IngredientInRecipe, Recipe, Tag)
+from recipes.signals import bulk_changed
+from recipes.transfer import (get_pool, image_name, open_stream, pool_map,
+                              write_image_data)
+
+
+def get_record_type(record):
+    """Функция получения типа записи выгрузки."""
+    return record.get('type') if isinstance(record, dict) else None
+
+
+def is_amount(value):
+    """Функция проверки количества ингредиента."""
+    return (isinstance(value, int)
+            and MIN_VALIDATOR_VALUE <= value <= MAX_VALIDATOR_VALUE)
+
+
+class Command(BaseCommand):
+    """Команда для загрузки рецептов из NDJSON выгрузки.
+
+    Рецепты с уже существующей короткой ссылкой пропускаются,
+    поэтому повторная загрузка той же выгрузки ничего не меняет.
+    """
+
+    help = ('Загружает рецепты с тегами, авторами, ингредиентами и фото '
+            'из выгрузки export_recipes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Путь к файлу (.gz - со сжатием) или - для stdin.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Число записей, сохраняемых за одну транзакцию.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов записи фото (0 - в текущем процессе).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('Размер пакета должен быть больше нуля.')
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.users = dict(FoodgramUser.objects.values_list('username', 'id'))
+        self.ingredients = dict(Ingredient.objects.values_list('name', 'id'))
+        self.counts = Counter()
+        handlers = {
+            'tag': self.import_tags,
+            'user': self.import_users,
+            'recipe': self.import_recipes,
+        }
+        try:
+            with open_stream(options['path'], 'rt') as file, \
+                    get_pool(options['workers']) as pool:
+                self.pool = pool
+                records = (json.loads(line) for line in file if line.strip())
+                for record_type, group in groupby(records, get_record_type):
+                    handler = handlers.get(record_type)
+                    for batch in iter(lambda: list(islice(group, batch_size)),
+                                      []):
+                        if handler is None:
+                            self.counts['skipped'] += len(batch)
+                            continue
+                        with transaction.atomic():
+                            handler(batch)
+        except (OSError, json.JSONDecodeError) as error:
+            raise CommandError(f'Ошибка чтения данных: {error}.')
+        finally:
+            self.bump_versions()
+        self.stdout.write(self.style.SUCCESS(
+            f'Загрузка завершена: рецептов добавлено {self.counts["recipes"]}'
+            f', пропущено {self.counts["skipped"]}; тегов добавлено '
+            f'{self.counts["tags"]}, пользователей {self.counts["users"]}, '
+            f'ингредиентов {self.counts["ingredients"]}.'))
+
+    def bump_versions(self):
+        """Метод увеличения версий измененных справочников и рецептов."""
+        for name, version in (('tags', ContentVersion.TAGS),
+                              ('users', ContentVersion.USERS),
+                              ('ingredients', ContentVersion.INGREDIENTS)):
+            if self.counts[name]:
+                ContentVersion.objects.bump(version)
+        models = tuple(model for name, model in (
+            ('recipes', Recipe), ('tags', Tag), ('ingredients', Ingredient),
+        ) if self.counts[name])
+        if models:
+            bulk_changed.send(sender=self.__class__, models=models)
+
+    def import_tags(self, records):
+        """Метод загрузки тегов, которых еще нет."""
+        new = {
+            record['slug']: Tag(name=record['name'], slug=record['slug'])
+            for record in records
+            if record.get('slug') and record.get('name')
+            and record['slug'] not in self.tags
+        }
+        Tag.objects.bulk_create(new.values(), ignore_conflicts=True)
+        created = dict(Tag.objects.filter(
+            slug__in=new).values_list('slug', 'id'))
+        self.tags.update(created)
+        self.counts['tags'] += len(created)
+
+    def import_users(self, records):
+        """Метод загрузки авторов без пароля, которых еще нет."""
+        password = make_password(None)
+        new = {
+            record['username']: FoodgramUser(
+                username=record['username'], email=record['email'],
+                first_name=record.get('first_name', ''),
+                last_name=record.get('last_name', ''), password=password)
+            for record in records
+            if record.get('username') and record.get('email')
+            and record['username'] not in self.users
+        }
+        FoodgramUser.objects.bulk_create(new.values(), ignore_conflicts=True)
+        created = dict(FoodgramUser.objects.filter(
+            username__in=new).values_list('username', 'id'))
+        self.users.update(created)
+        self.counts['users'] += len(created)
+
+    def import_ingredients(self, records):
+        """Метод загрузки ингредиентов рецептов, которых еще нет."""
+        new = {
+            row['name']: Ingredient(name=row['name'],
+                                    measurement_unit=row['measurement_unit'])
+            for record in records for row in record['ingredients']
+            if row['name'] not in self.ingredients
+        }
+        Ingredient.objects.bulk_create(new.values(), ignore_conflicts=True)
+        created = dict(Ingredient.objects.filter(
+            name__in=new).values_list('name', 'id'))
+        self.ingredients.update(created)
+        self.counts['ingredients'] += len(created)
+
+    def get_new_recipe_records(self, records):
+        """Метод отбора корректных записей новых рецептов.
+
+        Возвращает словарь {короткая ссылка: запись}. Запись без
+        имени файла фото пропускается, даже если в ней есть данные
+        фото: без имени файл некуда записать.
+        """
+        new = {}
+        for record in records:
+            if not (record.get('name') and record.get('text')
+                    and is_amount(record.get('cooking_time'))
+                    and record.get('author') in self.users
+                    and isinstance(record.get('image'), str)
+                    and record['image']):
+                continue
+            record['ingredients'] = [
+                row for row in record.get('ingredients') or ()
+                if isinstance(row, dict) and row.get('name')
+                and row.get('measurement_unit') and is_amount(row.get(
+                    'amount'))
+            ]
+            short_link = record.get('short_link') or ''.join(
+                secrets.choice(string.ascii_letters + string.digits)
+                for _ in range(SHORT_LINK_LENGTH + SHORT_LINK_ATTEMPTS)
+            )
+            new[short_link] = record
+        for short_link in Recipe.objects.filter(
+                short_link__in=new).values_list('short_link', flat=True):
+            del new[short_link]
+        return new
+
+    def save_images(self, records):
+        """Метод сохранения фото рецептов в пуле процессов.
+
+        Возвращает словарь {короткая ссылка: имя файла фото}.
+        """
+        upload_to = Recipe._meta.get_field('image').upload_to
+        images = {short_link: record.get('image')
+                  for short_link, record in records.items()}
+        uploads = [(short_link, (image_name(upload_to, record['image']),
+                                 record['image_data']))
+                   for short_link, record in records.items()
+                   if record.get('image_data')]
+        images.update(zip(
+            (short_link for short_link, _ in uploads),
+            pool_map(self.pool, write_image_data,
+                     [item for _, item in uploads])
+        ))
+        return images
+
+    def import_recipes(self, records):
+        """Метод загрузки пакета рецептов.
+
+        bulk_create не вызывает save и сигналы, поэтому счетчики
+        рецептов авторов обновляются здесь.
+        """
+        new = self.get_new_recipe_records(records)
+        self.import_ingredients(new.values())
+        images = self.save_images(new)
+        recipes = [
+            Recipe(short_link=short_link,
+                   author_id=self.users[record['author']],
+                   name=record['name'], text=record['text'],
+                   cooking_time=record['cooking_time'],
+                   image=images[short_link])
+            for short_link, record in new.items() if images[short_link]
+        ]
+        published = {
+            recipe.short_link: parse_datetime(
+                new[recipe.short_link].get('published_at') or '')
+            for recipe in recipes
+        }
+        Recipe.objects.bulk_create_recipes(recipes, {
+            short_link: published_at
+            for short_link, published_at in published.items()
+            if published_at is not None
+        })
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe_id=recipe.id,
+                               ingredient_id=self.ingredients[name],
+                               amount=amount)
+            for recipe in recipes
+            for name, amount in {
+                row['name']: row['amount']
+                for row in new[recipe.short_link]['ingredients']
+            }.items() if name in self.ingredients
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=self.tags[slug])
+            for recipe in recipes
+            for slug in set(new[recipe.short_link].get('tags') or ())
+            if slug in self.tags
+        )
+        self.increase_recipes_counts(recipes)
+        self.counts['recipes'] += len(recipes)
+        self.counts['skipped'] += len(records) - len(recipes)
+
+    @staticmethod
+    def increase_recipes_counts(recipes):
+        """Метод увеличения счетчиков рецептов авторов."""
+        authors_by_count = {}
+        for author_id, count in Counter(
+                recipe.author_id for recipe in recipes).items():
+            authors_by_count.setdefault(count, []).append(author_id)
+        for count, author_ids in authors_by_count.items():
+            FoodgramUser.objects.filter(id__in=author_ids).update(
+                recipes_count=F('recipes_count') + count)
@@ -0,0 +1,48 @@
+"""Модуль пользовательского скрипта обработки изображений."""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_avatar, process_recipe_image, run_task
+from recipes.models import FoodgramUser, Recipe
+
+
+class Command(BaseCommand):
+    """Команда для создания вариантов фото рецептов и аватаров."""
+
+    help = 'Создает уменьшенные варианты фото рецептов и аватаров.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать и изображения, у которых уже есть варианты.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        users = FoodgramUser.objects.exclude(avatar='').exclude(
+            avatar__isnull=True)
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+            users = users.filter(avatar_variants={})
+        tasks = [
+            (process_recipe_image, recipe_id)
+            for recipe_id in recipes.values_list('id', flat=True).iterator()
+        ] + [
+            (process_avatar, user_id)
+            for user_id in users.values_list('id', flat=True).iterator()
+        ]
+        if not settings.IMAGE_PROCESSING_WORKERS:
+            processed = sum(run_task(task, object_id)
+                            for task, object_id in tasks)
+        else:
+            with ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PROCESSING_WORKERS
+            ) as executor:
+                futures = [executor.submit(run_task, task, object_id)
+                           for task, object_id in tasks]
+                processed = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {processed}, '
+            f'с ошибками: {len(tasks) - processed}.'))
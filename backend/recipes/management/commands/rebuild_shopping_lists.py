@@ -0,0 +1,56 @@
+"""Модуль пользовательского скрипта пересчета списков покупок."""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingListTotal
+
+
+class Command(BaseCommand):
+    """Команда для пересчета или проверки итогов списков покупок."""
+
+    help = 'Пересчитывает итоги списков покупок по корзинам пользователей.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только проверить итоги, не изменяя их.'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id пользователя (можно указать несколько раз).'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if options['verify']:
+            return self.verify(user_ids)
+        with transaction.atomic():
+            totals = ShoppingListTotal.objects.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги списков покупок пересчитаны: {len(totals)} записей.'))
+
+    def verify(self, user_ids):
+        """Метод сравнения сохраненных итогов с расчетными."""
+        expected = ShoppingListTotal.objects.calculate(user_ids)
+        totals = ShoppingListTotal.objects.all()
+        if user_ids is not None:
+            totals = totals.filter(user_id__in=user_ids)
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in totals.values_list(
+                'user_id', 'ingredient_id', 'total_amount')
+        }
+        mismatches = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        for user_id, ingredient_id in sorted(mismatches):
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'сохранено {stored.get((user_id, ingredient_id))}, '
+                f'ожидается {expected.get((user_id, ingredient_id))}.'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}.')
+        self.stdout.write(self.style.SUCCESS('Расхождений не найдено.'))
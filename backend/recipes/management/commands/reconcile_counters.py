@@ -0,0 +1,52 @@
+"""Модуль пользовательского скрипта сверки счетчиков."""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, FoodgramUser, Recipe, Subscription
+
+
+def count_related(model, field):
+    """Функция получения подзапроса количества связанных объектов."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+COUNTERS = (
+    (FoodgramUser, 'recipes_count', Recipe, 'author'),
+    (FoodgramUser, 'subscribers_count', Subscription, 'recipe_author'),
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+)
+
+
+class Command(BaseCommand):
+    """Команда для исправления расхождений счетчиков с данными."""
+
+    help = 'Пересчитывает счетчики рецептов, подписчиков и избранного.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                drifted = model.objects.annotate(
+                    actual=count_related(related_model, related_field)
+                ).exclude(**{field: F('actual')}).values_list('pk', flat=True)
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = model.objects.filter(pk__in=list(drifted)).update(
+                        **{field: count_related(related_model, related_field)}
+                    )
+                self.stdout.write(
+                    f'{model._meta.verbose_name_plural}, {field}: '
+                    f'расхождений {fixed}.'
+                )
+        self.stdout.write(self.style.SUCCESS('Сверка счетчиков завершена.'))
@@ -0,0 +1,57 @@
+"""Модуль пользовательского скрипта расчета рейтинга трендов."""
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+class Command(BaseCommand):
+    """Команда для пересчета рейтинга трендов рецептов.
+
+    Рейтинг - сумма добавлений рецепта в избранное и корзину за
+    последние дни, вес которых убывает вдвое за каждый период
+    полураспада. Команду следует запускать периодически, например
+    из cron.
+    """
+
+    help = 'Пересчитывает рейтинг трендов рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=7,
+            help='Число последних дней, добавления за которые учитываются.'
+        )
+        parser.add_argument(
+            '--half-life', type=float, default=24,
+            help='Период полураспада веса добавления в часах.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пакета обновления рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        since = now - timedelta(days=options['days'])
+        decay = math.log(2) / (options['half_life'] * 3600)
+        scores = defaultdict(float)
+        for model in (Favorite, ShoppingCart):
+            for recipe_id, created_at in model.objects.filter(
+                created_at__gte=since
+            ).values_list('recipe_id', 'created_at').iterator():
+                scores[recipe_id] += math.exp(
+                    -decay * (now - created_at).total_seconds())
+        with transaction.atomic():
+            Recipe.objects.exclude(trending_score=0).update(trending_score=0)
+            Recipe.objects.bulk_update(
+                (Recipe(id=recipe_id, trending_score=score)
+                 for recipe_id, score in scores.items()),
+                ('trending_score',), batch_size=options['batch_size']
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Рейтинг трендов пересчитан для {len(scores)} рецептов.'))
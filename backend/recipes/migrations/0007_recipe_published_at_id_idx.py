@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_auto_20240913_1107'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-published_at', '-id'], name='recipe_published_at_id_idx'),
+        ),
+    ]
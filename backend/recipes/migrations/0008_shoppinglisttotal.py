@@ -0,0 +1,50 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list_totals(apps, schema_editor):
+    IngredientInRecipe = apps.get_model('recipes', 'IngredientInRecipe')
+    ShoppingListTotal = apps.get_model('recipes', 'ShoppingListTotal')
+    ShoppingListTotal.objects.bulk_create(
+        ShoppingListTotal(user_id=user_id, ingredient_id=ingredient_id,
+                          total_amount=total_amount)
+        for user_id, ingredient_id, total_amount
+        in IngredientInRecipe.objects.filter(
+            recipe__shopping_cart_recipe__isnull=False
+        ).values_list(
+            'recipe__shopping_cart_recipe__user_id', 'ingredient_id'
+        ).annotate(total_amount=models.Sum('amount')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_published_at_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.IntegerField(default=0, verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списка покупок',
+                'default_related_name': 'shopping_list_totals',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglisttotal',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_shoppinglist_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_list_totals,
+                             migrations.RunPython.noop),
+    ]
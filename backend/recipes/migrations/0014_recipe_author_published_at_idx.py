@@ -0,0 +1,17 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_orderings'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-published_at', '-id'], name='recipe_author_published_at_idx'),
+        ),
+    ]
@@ -1,25 +1,51 @@
 """Модуль моделией приложения Recipes."""
-import random
+import secrets
 import string
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
 
 from .constants import (EMAIL_MAX_LENGTH,
                         INGREDIENT_MEASURMENT_UNIT_MAX_LENGTH,
                         INGREDIENT_NAME_MAX_LENGTH,
                         MAX_VALIDATOR_VALUE, MIN_VALIDATOR_VALUE,
                         NAME_MAX_LENGTH, RECIPE_NAME_MAX_LENGTH,
-                        TAG_MAX_LENGTH)
+                        SEARCH_CONFIG, SHORT_LINK_ATTEMPTS,
+                        SHORT_LINK_LENGTH, TAG_MAX_LENGTH)
 
 
-class FoodgramUser(AbstractUser):
+class CounterFieldsMixin:
+    """Примесь, исключающая счетчики из сохранения всех полей.
+
+    Счетчики изменяются только атомарными запросами с F(), поэтому
+    сохранение ранее загруженного объекта не должно их перезаписывать.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        """Метод сохранения объекта без счетчиков."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class FoodgramUser(CounterFieldsMixin, AbstractUser):
     """Пользовательская модель приложения."""
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name',)
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     email = models.EmailField('Емейл', max_length=EMAIL_MAX_LENGTH,
                               unique=True)
@@ -30,6 +56,12 @@ class FoodgramUser(AbstractUser):
         null=True,
         default=None
     )
+    avatar_variants = models.JSONField(
+        'Варианты аватара', default=dict, blank=True, editable=False)
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False)
 
     class Meta:
         """Внутренний класс для сортировки объектов."""
@@ -90,9 +122,40 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeManager(models.Manager):
+    """Менеджер рецептов."""
+
+    def bulk_create_recipes(self, recipes, published=None):
+        """Метод пакетного создания рецептов с заданными ссылками.
+
+        bulk_create не возвращает id во всех СУБД и не вызывает save,
+        поэтому id находятся по коротким ссылкам, дата публикации
+        берется из словаря published {короткая ссылка: дата}, а
+        поисковый вектор заполняется отдельным запросом.
+        """
+        self.bulk_create(recipes)
+        ids = dict(self.filter(
+            short_link__in=[recipe.short_link for recipe in recipes]
+        ).values_list('short_link', 'id'))
+        published = published or {}
+        for recipe in recipes:
+            recipe.id = ids[recipe.short_link]
+            if recipe.short_link in published:
+                recipe.published_at = published[recipe.short_link]
+        self.bulk_update([recipe for recipe in recipes
+                          if recipe.short_link in published],
+                         ['published_at'])
+        if connections[self.db].vendor == 'postgresql':
+            self.filter(id__in=ids.values()).update(
+                search_vector=self.model.get_search_vector())
+        return recipes
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель рецептов."""
 
+    counter_fields = ('favorites_count', 'trending_score')
+
     author = models.ForeignKey(
         FoodgramUser,
         on_delete=models.CASCADE,
@@ -103,6 +166,8 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Фото', upload_to='recipes/images/',
     )
+    image_variants = models.JSONField(
+        'Варианты фото', default=dict, blank=True, editable=False)
     text = models.TextField('Текст')
     ingredients = models.ManyToManyField(
         Ingredient, through='IngredientInRecipe',
@@ -130,8 +195,21 @@ class Recipe(models.Model):
         'Дата и время создания',
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        'Дата и время изменения',
+        auto_now=True
+    )
     short_link = models.URLField(
         'Короткая ссылка', unique=True, editable=False)
+    favorites_count = models.PositiveIntegerField(
+        'Количество добавлений в избранное', default=0, editable=False)
+    trending_score = models.FloatField(
+        'Рейтинг популярности за последнее время', default=0,
+        editable=False)
+    search_vector = SearchVectorField(
+        'Поисковый вектор', null=True, editable=False)
+
+    objects = RecipeManager()
 
     class Meta:
         """Внутренний класс для сортировки и связанного имени объектов."""
@@ -141,16 +219,66 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
+        indexes = (
+            models.Index(fields=('-published_at', '-id'),
+                         name='recipe_published_at_id_idx'),
+            models.Index(fields=('-favorites_count', '-published_at', '-id'),
+                         name='recipe_popular_idx'),
+            models.Index(fields=('-trending_score', '-published_at', '-id'),
+                         name='recipe_trending_idx'),
+            models.Index(fields=('cooking_time', '-published_at', '-id'),
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=('author', '-published_at', '-id'),
+                         name='recipe_author_published_at_idx'),
+            GinIndex(fields=('search_vector',),
+                     name='recipe_search_vector_idx'),
+            GinIndex(fields=('name',), opclasses=('gin_trgm_ops',),
+                     name='recipe_name_trgm_idx'),
+        )
+
     def __str__(self):
         """Метод возвращающий имя."""
         return self.name
 
     def save(self, **kwargs):
-        """Функция генерации короткой ссылки."""
-        if not self.short_link:
-            self.short_link = ''.join(random.choice(
-                string.ascii_letters + string.digits) for _ in range(5))
-        super().save(**kwargs)
+        """Функция генерации короткой ссылки.
+
+        При совпадении случайной ссылки с существующей сохранение
+        повторяется с новой ссылкой большей длины.
+        """
+        if self.short_link:
+            super().save(**kwargs)
+        else:
+            self.save_with_short_link(**kwargs)
+        self.update_search_vector()
+
+    def save_with_short_link(self, **kwargs):
+        """Метод сохранения нового рецепта с уникальной короткой ссылкой."""
+        for attempt in range(SHORT_LINK_ATTEMPTS):
+            self.short_link = ''.join(
+                secrets.choice(string.ascii_letters + string.digits)
+                for _ in range(SHORT_LINK_LENGTH + attempt)
+            )
+            try:
+                with transaction.atomic(using=kwargs.get('using')):
+                    return super().save(**kwargs)
+            except IntegrityError:
+                if not Recipe.objects.filter(
+                        short_link=self.short_link).exists():
+                    raise
+        raise IntegrityError('Не удалось создать уникальную короткую ссылку.')
+
+    @staticmethod
+    def get_search_vector():
+        """Метод получения выражения поискового вектора рецепта."""
+        return (SearchVector('name', weight='A', config=SEARCH_CONFIG)
+                + SearchVector('text', weight='B', config=SEARCH_CONFIG))
+
+    def update_search_vector(self):
+        """Метод обновления поискового вектора в PostgreSQL."""
+        if connections[self._state.db].vendor == 'postgresql':
+            Recipe.objects.using(self._state.db).filter(pk=self.pk).update(
+                search_vector=self.get_search_vector())
 
 
 class IngredientInRecipe(models.Model):
@@ -240,6 +368,8 @@ class UserRecipeModel(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE,
     )
+    created_at = models.DateTimeField(
+        'Дата и время добавления', auto_now_add=True, db_index=True)
 
     class Meta:
         """Класс для порядка сортировки."""
@@ -284,3 +414,157 @@ class ShoppingCart(UserRecipeModel):
                 fields=('user', 'recipe',),
                 name='unique_user_shoppingcart_recipe'),
         )
+
+
+class ShoppingListTotalManager(models.Manager):
+    """Менеджер итогов списка покупок."""
+
+    def apply_amounts(self, user_ids, amounts):
+        """Метод изменения итогов пользователей на заданные количества.
+
+        amounts - словарь {id ингредиента: изменение количества}.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        self.bulk_create(
+            (self.model(user_id=user_id, ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id, amount in amounts.items() if amount > 0),
+            ignore_conflicts=True
+        )
+        ingredients_by_amount = {}
+        for ingredient_id, amount in amounts.items():
+            if amount:
+                ingredients_by_amount.setdefault(amount, []).append(
+                    ingredient_id)
+        for amount, ingredient_ids in ingredients_by_amount.items():
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=ingredient_ids
+            ).update(total_amount=F('total_amount') + amount)
+        self.filter(user_id__in=user_ids, total_amount__lte=0).delete()
+
+    def apply_recipe(self, user_ids, recipe_id, sign=1):
+        """Метод добавления (sign=1) или вычитания (sign=-1) рецепта."""
+        self.apply_recipes(user_ids, (recipe_id,), sign)
+
+    def apply_recipes(self, user_ids, recipe_ids, sign=1):
+        """Метод добавления (sign=1) или вычитания (sign=-1) рецептов."""
+        self.apply_amounts(user_ids, {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientInRecipe.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values_list('ingredient_id').annotate(
+                amount=Sum('amount')).order_by()
+        })
+
+    def calculate(self, user_ids=None):
+        """Метод расчета итогов по корзинам пользователей с нуля."""
+        lookups = {'recipe__shopping_cart_recipe__isnull': False}
+        if user_ids is not None:
+            lookups = {'recipe__shopping_cart_recipe__user_id__in': user_ids}
+        return {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in IngredientInRecipe.objects.filter(**lookups).values_list(
+                'recipe__shopping_cart_recipe__user_id', 'ingredient_id'
+            ).annotate(total_amount=Sum('amount')).order_by()
+        }
+
+    def rebuild(self, user_ids=None):
+        """Метод пересоздания итогов пользователей."""
+        totals = self.all()
+        if user_ids is not None:
+            totals = totals.filter(user_id__in=user_ids)
+        totals.delete()
+        return self.bulk_create(
+            self.model(user_id=user_id, ingredient_id=ingredient_id,
+                       total_amount=total_amount)
+            for (user_id, ingredient_id), total_amount
+            in self.calculate(user_ids).items()
+        )
+
+
+class ShoppingListTotal(models.Model):
+    """Модель итогового количества ингредиента в списке покупок.
+
+    Поддерживается при изменении корзины и ингредиентов рецептов,
+    чтобы выгрузка списка покупок читала готовые суммы.
+    """
+
+    user = models.ForeignKey(
+        FoodgramUser, on_delete=models.CASCADE, verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент',
+    )
+    total_amount = models.IntegerField('Общее количество', default=0)
+
+    objects = ShoppingListTotalManager()
+
+    class Meta:
+        """Класс для русификации и связанного имени объектов."""
+
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списка покупок'
+        default_related_name = 'shopping_list_totals'
+
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient',),
+                name='unique_user_shoppinglist_ingredient'),
+        )
+
+    def __str__(self):
+        """Метод возвращающий имя."""
+        return f'{self.ingredient.name} + {self.total_amount}'
+
+
+class ContentVersionManager(models.Manager):
+    """Менеджер версий данных."""
+
+    def bump(self, name):
+        """Метод увеличения версии данных."""
+        if not self.filter(name=name).update(
+                version=F('version') + 1, updated_at=timezone.now()):
+            self.get_or_create(name=name, defaults={'version': 1})
+
+    def get_versions(self, names):
+        """Метод получения версий и дат изменения данных.
+
+        Возвращает словарь {название: (версия, дата изменения)}.
+        """
+        versions = {
+            name: (version, updated_at)
+            for name, version, updated_at in self.filter(
+                name__in=names).values_list('name', 'version', 'updated_at')
+        }
+        return {name: versions.get(name, (0, None)) for name in names}
+
+
+class ContentVersion(models.Model):
+    """Модель версии данных.
+
+    Версия увеличивается при сохранении и удалении объектов и служит
+    дешевым признаком изменения данных для HTTP кеширования.
+    """
+
+    TAGS = 'tags'
+    INGREDIENTS = 'ingredients'
+    USERS = 'users'
+
+    name = models.CharField('Название', max_length=32, unique=True)
+    version = models.PositiveBigIntegerField('Версия', default=0)
+    updated_at = models.DateTimeField('Дата и время изменения', auto_now=True)
+
+    objects = ContentVersionManager()
+
+    class Meta:
+        """Класс для русификации объектов."""
+
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        """Метод возвращающий имя."""
+        return f'{self.name} + {self.version}'
@@ -0,0 +1,142 @@
+"""Модуль обработчиков сигналов приложения."""
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from .caches import short_link_cache
+from .models import (Favorite, FoodgramUser, IngredientInRecipe, Recipe,
+                     ShoppingCart, ShoppingListTotal, Subscription)
+
+# Отправляется после изменения состава ингредиентов рецепта.
+# Аргументы: instance - рецепт, added и removed - словари
+# {id ингредиента: количество}, changed - словарь
+# {id ингредиента: (старое количество, новое количество)}.
+ingredients_changed = Signal()
+
+# Отправляется командами массовой загрузки, которые пишут в обход
+# сигналов моделей. Аргумент models - измененные модели.
+bulk_changed = Signal()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_short_link(sender, instance, **kwargs):
+    """Функция сброса короткой ссылки рецепта в кеше."""
+    short_link_cache.invalidate(instance.short_link)
+
+
+def change_counter(model, pk, field, delta):
+    """Функция атомарного изменения счетчика объекта."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+@receiver(post_save, sender=Recipe)
+def increase_recipes_count(sender, instance, created, **kwargs):
+    """Функция увеличения счетчика рецептов автора."""
+    if created:
+        change_counter(FoodgramUser, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    """Функция уменьшения счетчика рецептов автора."""
+    change_counter(FoodgramUser, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    """Функция увеличения счетчика добавлений рецепта в избранное."""
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrease_favorites_count(sender, instance, **kwargs):
+    """Функция уменьшения счетчика добавлений рецепта в избранное."""
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increase_subscribers_count(sender, instance, created, **kwargs):
+    """Функция увеличения счетчика подписчиков автора."""
+    if created:
+        change_counter(FoodgramUser, instance.recipe_author_id,
+                       'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrease_subscribers_count(sender, instance, **kwargs):
+    """Функция уменьшения счетчика подписчиков автора."""
+    change_counter(FoodgramUser, instance.recipe_author_id,
+                   'subscribers_count', -1)
+
+
+def apply_to_shopping_lists(recipe_id, amounts):
+    """Функция изменения итогов списков покупок с рецептом."""
+    if amounts:
+        ShoppingListTotal.objects.apply_amounts(
+            ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+                'user_id', flat=True),
+            amounts
+        )
+
+
+@receiver(ingredients_changed, sender=Recipe)
+def update_shopping_list_totals(sender, instance, added, changed, removed,
+                                **kwargs):
+    """Функция изменения итогов списков покупок с рецептом.
+
+    Добавленные и измененные строки пишутся пакетно без сигналов,
+    удаленные учитывает сигнал post_delete ингредиента рецепта.
+    """
+    apply_to_shopping_lists(instance.id, {
+        **added,
+        **{ingredient_id: new - old
+           for ingredient_id, (old, new) in changed.items()},
+    })
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list_totals(sender, instance, created, **kwargs):
+    """Функция добавления рецепта из корзины в итоги списка покупок."""
+    if created:
+        ShoppingListTotal.objects.apply_recipe(
+            (instance.user_id,), instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def subtract_from_shopping_list_totals(sender, instance, **kwargs):
+    """Функция вычитания рецепта из итогов списка покупок.
+
+    Вычитаются ингредиенты, оставшиеся в БД: при каскадном удалении
+    рецепта уже удаленные строки ингредиентов вычел их сигнал.
+    """
+    ShoppingListTotal.objects.apply_recipe(
+        (instance.user_id,), instance.recipe_id, sign=-1)
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_ingredient_amount(sender, instance, **kwargs):
+    """Функция запоминания ингредиента и количества до сохранения."""
+    instance.saved_amount = instance.pk and IngredientInRecipe.objects.filter(
+        pk=instance.pk).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def update_totals_on_ingredient_save(sender, instance, **kwargs):
+    """Функция изменения итогов при сохранении ингредиента рецепта."""
+    amounts = {instance.ingredient_id: instance.amount}
+    if instance.saved_amount:
+        ingredient_id, amount = instance.saved_amount
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+    apply_to_shopping_lists(instance.recipe_id, amounts)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def update_totals_on_ingredient_delete(sender, instance, **kwargs):
+    """Функция вычитания удаленного ингредиента рецепта из итогов.
+
+    Вычитается у корзин, оставшихся в БД: при каскадном удалении
+    рецепта уже удаленные корзины вычел их сигнал.
+    """
+    apply_to_shopping_lists(instance.recipe_id,
+                            {instance.ingredient_id: -instance.amount})
@@ -0,0 +1,78 @@
+"""Модуль переноса рецептов между окружениями."""
+import base64
+import binascii
+import gzip
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def open_stream(path, mode, stdio=None):
+    """Функция открытия файла, сжатого gzip файла или потока stdio.
+
+    Путь - означает stdin или stdout, переданный в stdio.
+    """
+    if path == '-':
+        return nullcontext(stdio or (sys.stdin if 'r' in mode
+                                     else sys.stdout))
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def get_pool(workers):
+    """Функция получения пула процессов обработки изображений.
+
+    При нулевом числе процессов изображения обрабатываются
+    в текущем процессе.
+    """
+    if not workers:
+        return nullcontext(None)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def pool_map(pool, function, items):
+    """Функция применения функции к элементам в пуле с сохранением порядка."""
+    if pool is None:
+        return list(map(function, items))
+    return list(pool.map(function, items))
+
+
+def read_image_data(name):
+    """Функция чтения изображения в base64, None если файла нет."""
+    try:
+        with default_storage.open(name, 'rb') as file:
+            return base64.b64encode(file.read()).decode()
+    except OSError:
+        logger.warning('Не удалось прочитать изображение %s.', name)
+        return None
+
+
+def write_image_data(item):
+    """Функция декодирования, проверки и сохранения изображения.
+
+    Принимает пару (имя файла, base64), возвращает имя сохраненного
+    файла или None, если данные не являются изображением.
+    """
+    name, data = item
+    try:
+        content = base64.b64decode(data, validate=True)
+        Image.open(io.BytesIO(content)).verify()
+    except (binascii.Error, OSError, SyntaxError):
+        logger.warning('Некорректное изображение %s.', name)
+        return None
+    return default_storage.save(name, ContentFile(content))
+
+
+def image_name(upload_to, name):
+    """Функция получения имени файла в каталоге загрузки поля."""
+    return os.path.join(upload_to, os.path.basename(name))
@@ -1,13 +1,29 @@
 """Модуль представлений приложения."""
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404
+from django.shortcuts import redirect
 from rest_framework.decorators import api_view
 
-from recipes.models import Recipe
+from foodgram_backend.concurrency import render_view, run_sync
+from recipes.caches import short_link_cache
 
 
 @api_view(('GET', ))
 def recipe_shortlinked_retreave(request, slug):
     """Функция возврата рецепта по короткой ссылке."""
-    recipe = get_object_or_404(Recipe,
-                               short_link=slug)
-    return redirect(f'/recipes/{recipe.id}/')
+    recipe_id = short_link_cache.get_recipe_id(slug)
+    if recipe_id is None:
+        raise Http404('Рецепт не найден.')
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+async def recipe_shortlinked_retreave_async(request, slug):
+    """Асинхронная функция возврата рецепта по короткой ссылке.
+
+    Ссылка, найденная в кеше, обрабатывается без перехода в поток,
+    остальные запросы выполняет синхронное представление в пуле потоков.
+    """
+    recipe_id = short_link_cache.peek(slug)
+    if recipe_id is None:
+        return await run_sync(render_view, recipe_shortlinked_retreave,
+                              request, slug)
+    return redirect(f'/recipes/{recipe_id}/')